@@ -0,0 +1,258 @@
+"""Generate synthetic users with multi-year training histories for benchmarks.
+
+Every user gets the SEED_DATA plan (via build_seed_plan) and years of workout
+sessions and exercise logs following a double-progression curve. A fraction of
+users are heavy loggers: they train more often and log every set. Documents are
+written with unordered insert_many batches, several in flight at once.
+
+    cd backend && python generate_data.py --users 500 --years 3
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault("SKIP_FRONTEND_BUILD", "1")
+
+from server import (  # noqa: E402
+    SEED_DATA,
+    build_seed_plan,
+    build_session_report,
+    client,
+    db,
+    encode_log,
+    ensure_indexes,
+    exercise_logs,
+    exercise_names,
+    load_step,
+    parse_load,
+    rep_bounds,
+    session_summary,
+)
+
+# exercise_logs are stored in the compact schema, keyed by "u" instead of "user_id".
+USER_KEYS = {"exercise_logs": "u", "exercise_logs_archive": "u"}
+COLLECTIONS = [
+    "workout_plans", "exercise_catalog", "workout_sessions", "session_summaries",
+    "exercise_logs", "exercise_logs_archive", "exercise_log_rollups",
+]
+
+
+def target(collection: str):
+    # Live logs may sit in a time-series collection (EXERCISE_LOGS_TIMESERIES=1).
+    return exercise_logs if collection == "exercise_logs" else db[collection]
+
+
+class BulkWriter:
+    def __init__(self, batch_size: int, concurrency: int):
+        self.batch_size = batch_size
+        self.buffers = defaultdict(list)
+        self.counts = defaultdict(int)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.pending = set()
+
+    async def add(self, collection: str, doc: dict):
+        buffer = self.buffers[collection]
+        buffer.append(doc)
+        if len(buffer) >= self.batch_size:
+            await self.flush(collection)
+
+    async def flush(self, collection: str):
+        docs, self.buffers[collection] = self.buffers[collection], []
+        if not docs:
+            return
+        await self.semaphore.acquire()
+        task = asyncio.create_task(self._insert(collection, docs))
+        self.pending.add(task)
+        task.add_done_callback(self.pending.discard)
+
+    async def _insert(self, collection: str, docs: list):
+        try:
+            await target(collection).insert_many(docs, ordered=False)
+            self.counts[collection] += len(docs)
+        finally:
+            self.semaphore.release()
+
+    async def close(self):
+        for collection in list(self.buffers):
+            await self.flush(collection)
+        await asyncio.gather(*self.pending)
+
+
+class Athlete:
+    def __init__(self, user_id: str, heavy: bool, rng: random.Random):
+        self.user_id = user_id
+        self.heavy = heavy
+        self.rng = rng
+        self.sessions_per_week = rng.choice([5, 6]) if heavy else rng.choice([2, 3, 3, 4])
+        self.plans = [build_seed_plan(user_id, day) for day in SEED_DATA]
+        self.state = {}
+        for plan in self.plans:
+            for ex in plan["exercises"]:
+                low, _ = rep_bounds(ex)
+                load = parse_load(ex["current_load"])
+                if ex["current_load"] != "Bodyweight" and load == 0:
+                    load = float(rng.randrange(10, 40, 2))
+                self.state[ex["id"]] = {"load": load, "reps": low}
+        self.last_exercises = {}
+
+    def format_load(self, ex: dict) -> str:
+        if ex["current_load"] == "Bodyweight":
+            return "Bodyweight"
+        return f"{self.state[ex['id']]['load']:g}"
+
+    def train(self, plan: dict, completed_at: datetime):
+        """Return the session document and logs for one workout, then progress the loads."""
+        rng = self.rng
+        exercises, logs = [], []
+        for ex in plan["exercises"]:
+            state = self.state[ex["id"]]
+            low, high = rep_bounds(ex)
+            done = rng.random() > 0.05
+            reps = max(0, state["reps"] - (rng.randint(1, 2) if rng.random() < 0.15 else 0)) if ex["reps"] else 0
+            load = self.format_load(ex)
+            exercises.append({
+                "exercise_id": ex["id"],
+                "name": ex["name"],
+                "sets": ex["sets"],
+                "reps": reps,
+                "rep_range": ex.get("rep_range", ""),
+                "load": load,
+                "muscle_group": ex["muscle_group"],
+                "muscle_label": ex["muscle_label"],
+                "movement_id": ex["movement_id"],
+                "completed": done,
+                "was_modified": False,
+                "original_name": "",
+            })
+            if done and self.heavy and ex["reps"]:
+                for _ in range(ex["sets"]):
+                    logs.append(self._log(plan, ex, load, completed_at, sets=1, reps=reps))
+            if not done or not ex["reps"] or load == "Bodyweight":
+                continue
+            if reps >= high:
+                state["load"] += load_step(state["load"])
+                state["reps"] = low
+                logs.append(self._log(plan, ex, self.format_load(ex), completed_at))
+            elif rng.random() < 0.6:
+                state["reps"] = min(high, state["reps"] + 1)
+            if rng.random() < 0.01:
+                state["load"] = max(load_step(state["load"]), round(state["load"] * 0.9))
+                logs.append(self._log(plan, ex, self.format_load(ex), completed_at))
+
+        session = {
+            "id": str(uuid.uuid4()),
+            "user_id": self.user_id,
+            "day_number": plan["day_number"],
+            "day_name": plan["name"],
+            "completed_at": completed_at.isoformat(),
+            "duration_minutes": rng.randint(40, 95),
+            "exercises": exercises,
+            "report": build_session_report(exercises, self.last_exercises.get(plan["day_number"])),
+        }
+        self.last_exercises[plan["day_number"]] = exercises
+        return session, logs
+
+    def _log(self, plan: dict, ex: dict, load: str, completed_at: datetime, sets: int = 0, reps: int = 0) -> dict:
+        return {
+            "user_id": self.user_id,
+            "exercise_id": ex["id"],
+            "movement_id": ex["movement_id"],
+            "exercise_name": ex["name"],
+            "load": load,
+            "sets": sets,
+            "reps": reps,
+            "date": completed_at,
+            "day_number": plan["day_number"],
+        }
+
+    def final_plans(self):
+        for plan in self.plans:
+            for ex in plan["exercises"]:
+                ex["current_load"] = self.format_load(ex)
+        return self.plans
+
+
+async def generate_user(writer: BulkWriter, athlete: Athlete, start: datetime, end: datetime):
+    rng = athlete.rng
+    day = start
+    day_idx = 0
+    while day < end:
+        # Roughly two breaks of one to three weeks per year.
+        if rng.random() < 0.005:
+            day += timedelta(days=rng.randint(7, 21))
+            continue
+        if rng.random() < athlete.sessions_per_week / 7:
+            completed_at = day + timedelta(hours=rng.randint(6, 21), minutes=rng.randint(0, 59))
+            plan = athlete.plans[day_idx % len(athlete.plans)]
+            day_idx += 1
+            session, logs = athlete.train(plan, completed_at)
+            await writer.add("workout_sessions", session)
+            await writer.add("session_summaries", session_summary(session))
+            for log in logs:
+                await writer.add("exercise_logs", encode_log(log, await exercise_names.code(log["exercise_name"])))
+        day += timedelta(days=1)
+
+    for plan in athlete.final_plans():
+        await writer.add("workout_plans", plan)
+        for ex in plan["exercises"]:
+            await writer.add("exercise_catalog", {
+                "user_id": athlete.user_id,
+                "exercise_id": ex["id"],
+                "movement_id": ex["movement_id"],
+                "name": ex["name"],
+                "day_number": plan["day_number"],
+            })
+
+
+async def main(args):
+    rng = random.Random(args.seed)
+    end = datetime.now(timezone.utc)
+    start = (end - timedelta(days=int(365 * args.years))).replace(hour=0, minute=0, second=0, microsecond=0)
+    user_pattern = {"$regex": f"^{re.escape(args.prefix)}-"}
+
+    await ensure_indexes()
+    await exercise_names.load()
+    for collection in COLLECTIONS:
+        result = await target(collection).delete_many({USER_KEYS.get(collection, "user_id"): user_pattern})
+        if result.deleted_count:
+            print(f"Removed {result.deleted_count} existing {collection} documents")
+
+    writer = BulkWriter(args.batch_size, args.concurrency)
+    t0 = time.perf_counter()
+    for i in range(args.users):
+        heavy = rng.random() < args.heavy_fraction
+        athlete = Athlete(f"{args.prefix}-{i:05d}", heavy, random.Random(rng.random()))
+        await generate_user(writer, athlete, start, end)
+        if (i + 1) % 50 == 0:
+            print(f"{i + 1}/{args.users} users generated")
+    await writer.close()
+
+    elapsed = time.perf_counter() - t0
+    total = sum(writer.counts.values())
+    for collection in COLLECTIONS:
+        print(f"{collection}: {writer.counts[collection]}")
+    print(f"Inserted {total} documents in {elapsed:.1f}s ({total / max(elapsed, 1e-9):.0f} docs/s)")
+    client.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--years", type=float, default=2)
+    parser.add_argument("--heavy-fraction", type=float, default=0.1,
+                        help="share of users who train 5-6 times a week and log every set")
+    parser.add_argument("--prefix", default="synth", help="user ids are <prefix>-00000, <prefix>-00001, ...")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=4, help="insert_many batches in flight")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
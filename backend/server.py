@@ -1,18 +1,49 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Query
+from fastapi import FastAPI, APIRouter, File, Header, HTTPException, Query, UploadFile
+from fastapi.encoders import jsonable_encoder
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from starlette.responses import FileResponse
+from starlette.background import BackgroundTask
+from starlette.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from starlette.staticfiles import StaticFiles
 from motor.motor_asyncio import AsyncIOMotorClient
+from bson import ObjectId, json_util
+from pymongo import ASCENDING, DESCENDING, ReplaceOne, ReturnDocument, UpdateMany, UpdateOne, monitoring
+from pymongo.errors import BulkWriteError, CollectionInvalid, DuplicateKeyError, OperationFailure
 import os
+import io
+import fcntl
+import gzip
+import zlib
+import json
+import pstats
+import cProfile
+import threading
+import contextvars
 import re
+import math
+import time
+import random
+import socket
+import asyncio
+import functools
+import itertools
+import hashlib
 import logging
 import subprocess
+import tempfile
+from urllib.parse import parse_qs
 from pathlib import Path
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Literal, Optional
 import uuid
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+
+try:
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # only GET /api/export needs the columnar stack
+    pd = pa = pq = None
 
 ROOT_DIR = Path(__file__).parent
 FRONTEND_BUILD_DIR = ROOT_DIR.parent / "frontend" / "build"
@@ -20,8 +51,59 @@ FRONTEND_DIR = ROOT_DIR.parent / "frontend"
 FALLBACK_FRONTEND_FILE = ROOT_DIR / "static" / "index.html"
 load_dotenv(ROOT_DIR / '.env')
 
+
+class CommandTrace:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.commands = []
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def start(self, event):
+        entry = {
+            "command": event.command_name,
+            "collection": event.command.get(event.command_name) if isinstance(
+                event.command.get(event.command_name), str) else None,
+            "offset_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "duration_ms": None,
+            "ok": None,
+        }
+        with self._lock:
+            self.commands.append(entry)
+            self._pending[event.request_id] = (entry, time.perf_counter())
+
+    def finish(self, event, ok: bool):
+        with self._lock:
+            entry, t0 = self._pending.pop(event.request_id, (None, None))
+        if entry is not None:
+            entry["duration_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+            entry["ok"] = ok
+
+
+command_trace = contextvars.ContextVar("command_trace", default=None)
+
+
+class CommandTimeline(monitoring.CommandListener):
+    """Record Mongo commands into the CommandTrace bound to the current context, if any."""
+
+    def started(self, event):
+        trace = command_trace.get()
+        if trace is not None:
+            trace.start(event)
+
+    def succeeded(self, event):
+        trace = command_trace.get()
+        if trace is not None:
+            trace.finish(event, True)
+
+    def failed(self, event):
+        trace = command_trace.get()
+        if trace is not None:
+            trace.finish(event, False)
+
+
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[CommandTimeline()])
 db_name = re.sub(r'\s+', '_', os.environ['DB_NAME'].strip())
 if not db_name:
     raise RuntimeError("DB_NAME environment variable cannot be empty")
@@ -53,17 +135,1083 @@ def ensure_frontend_build():
         logging.getLogger(__name__).warning("Frontend build unavailable: %s", exc)
 
 
+class SingleFlight:
+    """Share one in-flight awaitable between concurrent calls with the same key."""
+
+    def __init__(self):
+        self._inflight = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key, fn):
+        task = self._inflight.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(functools.partial(self._forget, key))
+        else:
+            self.followers += 1
+        # Shield so a disconnecting caller does not cancel the query for everyone else.
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+
+read_flight = SingleFlight()
+
+
+class UserCache:
+    """Per-user read cache. Only serves entries while `enabled`, which the
+    invalidation bus turns on once its change stream is open."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.enabled = False
+        self._entries = {}
+        self._generations = {}
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def generation(self, user_id: str) -> int:
+        return self._generations.get(user_id, 0)
+
+    def get(self, user_id: str, key):
+        if not self.enabled:
+            return False, None
+        entry = self._entries.get(user_id, {}).get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self.counters["misses"] += 1
+            return False, None
+        self.counters["hits"] += 1
+        return True, entry[1]
+
+    def put(self, user_id: str, key, value, generation: int):
+        # Skip values read before an eviction for this user landed.
+        if self.enabled and generation == self.generation(user_id):
+            self._entries.setdefault(user_id, {})[key] = (time.monotonic() + self.ttl, value)
+
+    def evict_user(self, user_id: str):
+        self._generations[user_id] = self.generation(user_id) + 1
+        if self._entries.pop(user_id, None) is not None:
+            self.counters["evictions"] += 1
+
+    def clear(self):
+        for user_id in list(self._generations) + list(self._entries):
+            self._generations[user_id] = self.generation(user_id) + 1
+        self._entries.clear()
+
+    def set_enabled(self, enabled: bool):
+        self.clear()
+        self.enabled = enabled
+
+    def snapshot(self) -> dict:
+        return {**self.counters, "enabled": self.enabled, "users": len(self._entries)}
+
+
+user_cache = UserCache(ttl=float(os.environ.get("CACHE_TTL_SECONDS", "60")))
+
+
+def coalesced(fn):
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        key = (fn.__name__, args, tuple(sorted(kwargs.items())))
+        user_id = kwargs.get("user_id")
+        if user_id is None:
+            return await read_flight.do(key, lambda: fn(*args, **kwargs))
+        hit, value = user_cache.get(user_id, key)
+        if hit:
+            return value
+        generation = user_cache.generation(user_id)
+        # Keyed on the generation too: a read issued after one of the user's writes
+        # must not join a read that started before it.
+        value = await read_flight.do((key, generation), lambda: fn(*args, **kwargs))
+        user_cache.put(user_id, key, value, generation)
+        return value
+    return wrapper
+
+
+def invalidate_user(user_id: str):
+    user_cache.evict_user(user_id)
+
+
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", "86400"))
+# A key still pending after this long belongs to a request that died mid-way.
+IDEMPOTENCY_PENDING_SECONDS = 60
+
+
+def idempotent(scope: str):
+    """Honour an `Idempotency-Key` header on a create endpoint.
+
+    The handler must take `user_id` and `idempotency_key` arguments. The first
+    request with a key claims it in `idempotency_keys` and stores its response; a
+    retry gets that response back (with `Idempotent-Replayed: true`) without
+    running the handler. A retry while the first request is still running gets
+    409, and reusing a key for a different body gets 422. Failed requests release
+    their key so they can be retried. Keys expire after IDEMPOTENCY_TTL_SECONDS.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            key = kwargs.get("idempotency_key")
+            if key is None:
+                return await fn(*args, **kwargs)
+            if not 0 < len(key) <= 255:
+                raise HTTPException(400, "Idempotency-Key must be 1 to 255 characters")
+            body = {name: value for name, value in kwargs.items() if name != "idempotency_key"}
+            fingerprint = hashlib.sha256(
+                json.dumps(jsonable_encoder(body), sort_keys=True).encode()
+            ).hexdigest()
+            key_id = f"{kwargs['user_id']}:{scope}:{key}"
+            now = datetime.now(timezone.utc)
+            try:
+                await db.idempotency_keys.insert_one(
+                    {"_id": key_id, "fingerprint": fingerprint, "state": "pending", "created_at": now}
+                )
+            except DuplicateKeyError:
+                stored = await db.idempotency_keys.find_one({"_id": key_id})
+                if stored is None:
+                    # Released by a failed attempt between the two calls.
+                    raise HTTPException(409, "Idempotency-Key was released, retry the request")
+                if stored["fingerprint"] != fingerprint:
+                    raise HTTPException(422, "Idempotency-Key was used for a different request")
+                if stored["state"] == "done":
+                    return JSONResponse(stored["response"], headers={"Idempotent-Replayed": "true"})
+                taken_over = await db.idempotency_keys.update_one(
+                    {"_id": key_id, "state": "pending",
+                     "created_at": {"$lt": now - timedelta(seconds=IDEMPOTENCY_PENDING_SECONDS)}},
+                    {"$set": {"created_at": now}},
+                )
+                if not taken_over.modified_count:
+                    raise HTTPException(409, "Request with this Idempotency-Key is in progress")
+            try:
+                response = jsonable_encoder(await fn(*args, **kwargs))
+            except BaseException:
+                await db.idempotency_keys.delete_one({"_id": key_id, "state": "pending"})
+                raise
+            await db.idempotency_keys.update_one(
+                {"_id": key_id}, {"$set": {"state": "done", "response": response}}
+            )
+            return response
+        return wrapper
+    return decorator
+
+
+class CacheInvalidationBus:
+    """Tail a change stream and evict per-user cache entries in this worker.
+
+    Needs a replica set (a single-node one is enough). While the stream is down the
+    cache is disabled; after a disconnect the stream resumes from the last token.
+    """
+
+    COLLECTIONS = [
+        "workout_plans", "workout_sessions", "exercise_logs", "exercise_log_rollups", "exercise_catalog",
+        "user_analytics",
+    ]
+    NOT_REPLICA_SET = 40573
+    HISTORY_LOST = 286
+
+    def __init__(self):
+        self.resume_token = None
+        self.status = "stopped"
+        self.events = 0
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        user_cache.set_enabled(False)
+        self.status = "stopped"
+
+    def handle(self, change: dict):
+        self.events += 1
+        doc = change.get("fullDocument") or {}
+        # Compact exercise_logs store the owner under "u", change_counters under "_id".
+        user_id = doc.get("user_id", doc.get("u"))
+        if user_id is None and change.get("ns", {}).get("coll") == "change_counters":
+            user_id = doc.get("_id")
+        if user_id is not None:
+            user_cache.evict_user(user_id)
+        else:
+            # Deletes and drops carry no user_id; drop everything rather than serve stale data.
+            user_cache.clear()
+
+    async def _run(self):
+        log = logging.getLogger(__name__)
+        backoff = 1
+        collections = self.COLLECTIONS
+        if exercise_logs.timeseries:
+            # Change streams skip time-series collections; every log write also bumps the change counter.
+            collections = collections + ["change_counters"]
+        pipeline = [{"$match": {"ns.coll": {"$in": collections}}}]
+        while True:
+            try:
+                async with db.watch(pipeline, full_document="updateLookup", resume_after=self.resume_token) as stream:
+                    self.status = "running"
+                    user_cache.set_enabled(True)
+                    backoff = 1
+                    async for change in stream:
+                        self.resume_token = stream.resume_token
+                        self.handle(change)
+            except OperationFailure as exc:
+                user_cache.set_enabled(False)
+                if exc.code == self.NOT_REPLICA_SET:
+                    self.status = "unsupported"
+                    log.warning("Change streams unavailable, per-user cache disabled: %s", exc)
+                    return
+                if exc.code == self.HISTORY_LOST:
+                    self.resume_token = None
+                self.status = "reconnecting"
+                log.warning("Change stream failed, retrying in %ss: %s", backoff, exc)
+            except Exception as exc:
+                user_cache.set_enabled(False)
+                self.status = "reconnecting"
+                log.warning("Change stream disconnected, retrying in %ss: %s", backoff, exc)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+
+invalidation_bus = CacheInvalidationBus()
+
+
+LIVE_EVENTS_PATH = "/api/live"
+
+
+class LiveEventHub:
+    """In-process pub/sub of per-user write events for the SSE stream.
+
+    Every subscriber gets a bounded queue. A subscriber that falls behind is not
+    allowed to hold memory or slow writers down: its backlog is dropped and replaced
+    by a single `resync` event, after which the client re-reads what it shows.
+    Only writes handled by this worker are published.
+    """
+
+    def __init__(self, queue_size: int, max_per_user: int):
+        self.queue_size = queue_size
+        self.max_per_user = max_per_user
+        self.subscribers = {}
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, user_id: str) -> Optional[asyncio.Queue]:
+        queues = self.subscribers.setdefault(user_id, set())
+        if len(queues) >= self.max_per_user:
+            return None
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        queues.add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue):
+        queues = self.subscribers.get(user_id, set())
+        queues.discard(queue)
+        if not queues:
+            self.subscribers.pop(user_id, None)
+
+    def publish(self, user_id: str, event: str, data: dict):
+        queues = self.subscribers.get(user_id)
+        if not queues:
+            return
+        self.published += 1
+        message = {"event": event, "data": data, "at": datetime.now(timezone.utc).isoformat()}
+        for queue in queues:
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self.dropped += queue.qsize()
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"event": "resync", "data": {}, "at": message["at"]})
+
+    def snapshot(self) -> dict:
+        return {
+            "users": len(self.subscribers),
+            "subscribers": sum(len(q) for q in self.subscribers.values()),
+            "published": self.published,
+            "dropped": self.dropped,
+        }
+
+
+live_events = LiveEventHub(
+    queue_size=int(os.environ.get("LIVE_QUEUE_SIZE", "100")),
+    max_per_user=int(os.environ.get("LIVE_MAX_SUBSCRIBERS_PER_USER", "5")),
+)
+
+
+class AdmissionController:
+    """Per-user token buckets plus a global concurrency cap with a bounded wait queue."""
+
+    MAX_BUCKETS = 10000
+
+    def __init__(self, rate: float, burst: float, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.buckets = {}
+        self.semaphore = asyncio.Semaphore(max_concurrent)
+        self.in_flight = 0
+        self.waiting = 0
+        self.counters = {"admitted": 0, "rate_limited": 0, "queue_full": 0, "queue_timeout": 0, "peak_waiting": 0}
+
+    def take_token(self, key: str) -> float:
+        """Consume one token for `key`; return 0 when allowed, otherwise seconds until the next token."""
+        now = time.monotonic()
+        tokens, updated = self.buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens < 1:
+            self.buckets[key] = (tokens, now)
+            return (1 - tokens) / self.rate
+        self.buckets[key] = (tokens - 1, now)
+        if len(self.buckets) > self.MAX_BUCKETS:
+            self._prune(now)
+        return 0
+
+    def _prune(self, now: float):
+        refill = self.burst / self.rate
+        self.buckets = {k: v for k, v in self.buckets.items() if now - v[1] < refill}
+
+    def snapshot(self) -> dict:
+        return {
+            **self.counters,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "tracked_clients": len(self.buckets),
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+        }
+
+
+class AdmissionControlMiddleware:
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith("/api/"):
+            return await self.app(scope, receive, send)
+        ctl = self.controller
+        query = parse_qs(scope.get("query_string", b"").decode())
+        client_key = query.get("user_id", [None])[0] or (scope.get("client") or ("anonymous",))[0]
+
+        retry_after = ctl.take_token(client_key)
+        if retry_after:
+            ctl.counters["rate_limited"] += 1
+            return await self._reject(scope, receive, send, "Rate limit exceeded", retry_after)
+        if scope["path"] == LIVE_EVENTS_PATH:
+            # Event streams stay open for minutes; they must not hold a concurrency slot.
+            return await self.app(scope, receive, send)
+        if ctl.semaphore.locked():
+            if ctl.waiting >= ctl.max_queue:
+                ctl.counters["queue_full"] += 1
+                return await self._reject(scope, receive, send, "Server busy", ctl.queue_timeout)
+            ctl.waiting += 1
+            ctl.counters["peak_waiting"] = max(ctl.counters["peak_waiting"], ctl.waiting)
+            try:
+                await asyncio.wait_for(ctl.semaphore.acquire(), ctl.queue_timeout)
+            except asyncio.TimeoutError:
+                ctl.counters["queue_timeout"] += 1
+                return await self._reject(scope, receive, send, "Server busy", ctl.queue_timeout)
+            finally:
+                ctl.waiting -= 1
+        else:
+            await ctl.semaphore.acquire()
+
+        ctl.counters["admitted"] += 1
+        ctl.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            ctl.in_flight -= 1
+            ctl.semaphore.release()
+
+    @staticmethod
+    async def _reject(scope, receive, send, detail: str, retry_after: float):
+        response = JSONResponse(
+            {"detail": detail}, status_code=429, headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+        await response(scope, receive, send)
+
+
+admission = AdmissionController(
+    rate=float(os.environ.get("RATE_LIMIT_PER_SECOND", "20")),
+    burst=float(os.environ.get("RATE_LIMIT_BURST", "100")),
+    max_concurrent=int(os.environ.get("MAX_CONCURRENT_REQUESTS", "32")),
+    max_queue=int(os.environ.get("MAX_QUEUED_REQUESTS", "64")),
+    queue_timeout=float(os.environ.get("QUEUE_TIMEOUT_SECONDS", "5")),
+)
+
+
+class BackgroundScheduler:
+    """Run periodic jobs off the request path, one worker at a time per job.
+
+    Each job holds a lease in `app_meta` (`job_lock:<name>`) for its interval, so
+    with several uvicorn workers only the lease holder runs it. Runtime and outcome
+    of the last run are recorded under `job_status:<name>`.
+    """
+
+    def __init__(self):
+        self.jobs = {}
+        self.tasks = []
+        self.stats = {}
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._stopping = None
+
+    def add_job(self, name: str, fn, interval: float, jitter: float = 0.1):
+        self.jobs[name] = {"fn": fn, "interval": interval, "jitter": jitter}
+        self.stats[name] = {"runs": 0, "skipped": 0, "failures": 0, "last_duration_ms": None, "last_status": None}
+
+    def start(self):
+        self._stopping = asyncio.Event()
+        self.tasks = [asyncio.create_task(self._loop(name)) for name in self.jobs]
+
+    async def stop(self, timeout: float = 10):
+        if self._stopping is None:
+            return
+        self._stopping.set()
+        if self.tasks:
+            _, pending = await asyncio.wait(self.tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        self.tasks = []
+
+    def snapshot(self) -> dict:
+        return {"owner": self.owner, "jobs": self.stats}
+
+    async def _loop(self, name: str):
+        job = self.jobs[name]
+        delay = random.uniform(0, job["interval"] * job["jitter"])
+        while True:
+            try:
+                await asyncio.wait_for(self._stopping.wait(), delay)
+                return
+            except asyncio.TimeoutError:
+                pass
+            await self.run_once(name)
+            delay = job["interval"] * (1 + random.uniform(-job["jitter"], job["jitter"]))
+
+    async def _acquire(self, name: str, now: datetime) -> bool:
+        lease = timedelta(seconds=self.jobs[name]["interval"])
+        try:
+            await db.app_meta.update_one(
+                {"key": f"job_lock:{name}", "$or": [{"locked_until": {"$lte": now}}, {"owner": self.owner}]},
+                {"$set": {"owner": self.owner, "locked_until": now + lease}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            return False
+        return True
+
+    async def run_once(self, name: str) -> bool:
+        stats = self.stats[name]
+        started = datetime.now(timezone.utc)
+        try:
+            if not await self._acquire(name, started):
+                stats["skipped"] += 1
+                return False
+        except Exception:
+            logging.getLogger(__name__).exception("Could not acquire lock for job %s", name)
+            return False
+        t0 = time.perf_counter()
+        status, error = "ok", None
+        try:
+            await self.jobs[name]["fn"]()
+        except Exception as exc:
+            status, error = "error", repr(exc)
+            stats["failures"] += 1
+            logging.getLogger(__name__).exception("Background job %s failed", name)
+        duration_ms = round((time.perf_counter() - t0) * 1000, 1)
+        stats.update(runs=stats["runs"] + 1, last_duration_ms=duration_ms, last_status=status)
+        try:
+            await db.app_meta.update_one(
+                {"key": f"job_status:{name}"},
+                {"$set": {
+                    "owner": self.owner,
+                    "last_started_at": started.isoformat(),
+                    "last_duration_ms": duration_ms,
+                    "last_status": status,
+                    "last_error": error,
+                }, "$inc": {"runs": 1}},
+                upsert=True,
+            )
+        except Exception:
+            logging.getLogger(__name__).exception("Could not record status for job %s", name)
+        return True
+
+
+scheduler = BackgroundScheduler()
+
+
+class ProfilingMiddleware:
+    """Opt-in per-request profiling.
+
+    A request is profiled when it carries `X-Profile: <PROFILE_ADMIN_TOKEN>` or is
+    picked by PROFILE_SAMPLE_RATE (0 by default). The handler runs under cProfile
+    with a Mongo command timeline; the result is written to PROFILE_DIR, or returned
+    in place of the response body when `X-Profile-Output: inline` is also sent.
+    cProfile sees the whole event loop, so concurrent requests show up too, and
+    only one request is profiled at a time.
+    """
+
+    def __init__(self, app, admin_token: str, sample_rate: float, output_dir: Path, max_bytes: int):
+        self.app = app
+        self.admin_token = admin_token
+        self.sample_rate = sample_rate
+        self.output_dir = output_dir
+        self.max_bytes = max_bytes
+        self._busy = False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith("/api/") or scope["path"] == LIVE_EVENTS_PATH:
+            return await self.app(scope, receive, send)
+        headers = dict(scope.get("headers") or [])
+        requested = bool(self.admin_token) and headers.get(b"x-profile", b"").decode() == self.admin_token
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        if self._busy or not (requested or sampled):
+            return await self.app(scope, receive, send)
+        inline = requested and headers.get(b"x-profile-output", b"").decode() == "inline"
+
+        self._busy = True
+        profile_id = f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:6]}"
+        response = {"status": None, "body": []}
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                if inline:
+                    return
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", profile_id.encode())]}
+            elif inline:
+                response["body"].append(message.get("body", b""))
+                return
+            await send(message)
+
+        trace = CommandTrace()
+        token = command_trace.set(trace)
+        profiler = cProfile.Profile()
+        t0 = time.perf_counter()
+        try:
+            profiler.enable()
+            try:
+                await self.app(scope, receive, capture)
+            finally:
+                profiler.disable()
+        finally:
+            command_trace.reset(token)
+            self._busy = False
+
+        report = self._report(profile_id, scope, response["status"], time.perf_counter() - t0, profiler, trace)
+        if inline:
+            await JSONResponse(report)(scope, receive, send)
+        else:
+            await asyncio.get_running_loop().run_in_executor(None, self._write, profile_id, report)
+
+    def _report(self, profile_id, scope, status, elapsed, profiler, trace) -> dict:
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(40)
+        stats_text = out.getvalue()
+        if len(stats_text) > self.max_bytes:
+            stats_text = stats_text[:self.max_bytes] + "\n... truncated"
+        return {
+            "id": profile_id,
+            "method": scope["method"],
+            "path": scope["path"],
+            "query": scope.get("query_string", b"").decode(),
+            "status": status,
+            "wall_ms": round(elapsed * 1000, 2),
+            "mongo_commands": trace.commands[:500],
+            "stats": stats_text,
+        }
+
+    def _write(self, profile_id: str, report: dict):
+        try:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            (self.output_dir / f"{profile_id}.json").write_text(json.dumps(report, indent=1))
+        except OSError as exc:
+            logging.getLogger(__name__).warning("Could not write profile %s: %s", profile_id, exc)
+
+
 def parse_load(load_str: str) -> float:
     if not load_str or load_str == "Bodyweight":
         return 0
-    match = re.match(r'(\d+)', str(load_str))
-    return float(match.group(1)) if match else 0
+    match = re.match(r'\d+(\.\d+)?', str(load_str))
+    return float(match.group()) if match else 0
+
+
+REP_RANGE_RE = re.compile(r'^\s*(\d+)\s*[/-]\s*(\d+)\s*$')
+
+
+def rep_bounds(ex: dict) -> tuple:
+    """(low, high) of a `rep_range` such as "6/10"; (reps, reps) when there is no usable range."""
+    match = REP_RANGE_RE.match(ex.get("rep_range") or "")
+    if match:
+        return int(match.group(1)), int(match.group(2))
+    return ex["reps"], ex["reps"]
+
+
+def load_step(load: float) -> float:
+    if load < 10:
+        return 1
+    if load < 40:
+        return 2
+    return 5
+
+
+FIELD_PATH_RE = re.compile(r'^[a-z_]+(\.[a-z_]+)*$')
+PLAN_FIELDS = {"id", "user_id", "day_number", "name", "exercises", "seq", "version"}
+SESSION_FIELDS = {
+    "id", "user_id", "day_number", "day_name", "completed_at", "duration_minutes", "exercises", "report", "seq",
+}
+SESSION_SUMMARY_FIELDS = (
+    "id", "day_number", "day_name", "completed_at", "duration_minutes",
+    "completed_exercises", "total_exercises", "total_volume", "load_change_count",
+)
+SESSION_SUMMARY_PROJECTION = {"_id": 0, **{field: 1 for field in SESSION_SUMMARY_FIELDS}}
+LOG_FIELDS = {
+    "id", "user_id", "exercise_id", "movement_id", "exercise_name",
+    "load", "sets", "reps", "date", "day_number", "seq",
+}
+
+
+def build_projection(fields: Optional[str], allowed: set) -> dict:
+    """Turn a comma separated `fields=` value into a Mongo projection."""
+    if not fields:
+        return {"_id": 0}
+    paths = set()
+    for path in fields.split(","):
+        path = path.strip()
+        if not FIELD_PATH_RE.match(path) or path.split(".")[0] not in allowed:
+            raise HTTPException(400, f"Unknown field: {path}")
+        paths.add(path)
+    # Mongo rejects a projection that names both a path and one of its parents.
+    paths = {p for p in paths if not any(p.startswith(other + ".") for other in paths)}
+    return {"_id": 0, **{p: 1 for p in sorted(paths)}}
+
+
+# Stored exercise_logs use short keys; the API keeps the long names.
+LOG_KEYS = {
+    "id": "_id", "user_id": "u", "exercise_id": "e", "movement_id": "m", "exercise_name": "n",
+    "load": "l", "sets": "s", "reps": "r", "date": "d", "day_number": "dn", "seq": "q",
+}
+
+
+def encode_log(log: dict, name_code: int) -> dict:
+    """Compact storage form of an API-shaped log. `date` becomes a BSON datetime (ms precision)."""
+    date = log["date"]
+    if isinstance(date, str):
+        date = datetime.fromisoformat(date)
+    doc = {
+        "u": log["user_id"],
+        "e": log["exercise_id"],
+        "m": log.get("movement_id") or movement_id_for(log.get("exercise_name", "")),
+        "n": name_code,
+        "l": log.get("load", ""),
+        "d": date.replace(microsecond=date.microsecond // 1000 * 1000),
+        "dn": log.get("day_number", 0),
+    }
+    # Load-change logs have no sets/reps; keep that distinction instead of storing zeros.
+    for field in ("sets", "reps", "seq"):
+        if field in log:
+            doc[LOG_KEYS[field]] = log[field]
+    return doc
+
+
+def decode_log(doc: dict, names: dict) -> dict:
+    """API shape of a stored log, limited to the keys that were fetched."""
+    log = {}
+    for field, key in LOG_KEYS.items():
+        if key not in doc:
+            continue
+        value = doc[key]
+        if key == "_id":
+            value = str(value)
+        elif key == "n":
+            value = names.get(value, "")
+        elif key == "d":
+            value = (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).isoformat()
+        log[field] = value
+    return log
+
+
+def log_projection(fields: Optional[str]) -> Optional[dict]:
+    projection = build_projection(fields, LOG_FIELDS)
+    if len(projection) == 1:
+        return None
+    keys = {LOG_KEYS[path.split(".")[0]] for path in projection if path != "_id"}
+    return {"_id": int("_id" in keys), **{key: 1 for key in keys if key != "_id"}}
+
+
+EXERCISE_LOGS_TIMESERIES = os.environ.get("EXERCISE_LOGS_TIMESERIES", "0") == "1"
+
+
+class SeriesCursor:
+    """Motor cursor over a time-series log collection that yields flat compact logs."""
+
+    def __init__(self, cursor, flatten):
+        self.cursor = cursor
+        self.flatten = flatten
+
+    def sort(self, *args, **kwargs):
+        self.cursor.sort(*args, **kwargs)
+        return self
+
+    def limit(self, limit: int):
+        self.cursor.limit(limit)
+        return self
+
+    async def to_list(self, length: Optional[int]) -> List[dict]:
+        return [self.flatten(doc) for doc in await self.cursor.to_list(length)]
+
+    async def __aiter__(self):
+        async for doc in self.cursor:
+            yield self.flatten(doc)
+
+
+class ExerciseLogStore:
+    """The compact exercise logs, in a plain collection or a native time-series one.
+
+    Callers always see flat compact documents (u, e, m, d, ...). In time-series
+    mode the series key (user, exercise and its movement) is stored under the
+    meta field `k` and `d` is the time field; filters, projections and index
+    keys are rewritten to match. Logs are deleted by _id (migration, journal
+    replay, archiving), which a time-series collection only allows from MongoDB
+    7.0, so create() refuses older servers.
+    """
+
+    META_FIELD = "k"
+    META_KEYS = ("u", "e", "m")
+
+    def __init__(self, timeseries: bool):
+        self.timeseries = timeseries
+        self.name = "exercise_log_series" if timeseries else "exercise_logs"
+
+    @property
+    def collection(self):
+        return db[self.name]
+
+    def _key(self, key: str) -> str:
+        return f"{self.META_FIELD}.{key}" if self.timeseries and key in self.META_KEYS else key
+
+    def _stored(self, doc: dict) -> dict:
+        if not self.timeseries:
+            return doc
+        meta = {key: doc[key] for key in self.META_KEYS if key in doc}
+        return {self.META_FIELD: meta, **{k: v for k, v in doc.items() if k not in self.META_KEYS}}
+
+    def _flat(self, doc: dict) -> dict:
+        return {**doc.pop(self.META_FIELD, {}), **doc}
+
+    async def create(self):
+        if not self.timeseries:
+            return
+        info = await client.admin.command("buildInfo")
+        if tuple(info["versionArray"][:2]) < (7, 0):
+            raise RuntimeError(
+                f"EXERCISE_LOGS_TIMESERIES=1 needs MongoDB 7.0 or later, the server is {info['version']}"
+            )
+        if await db.list_collection_names(filter={"name": self.name}):
+            return
+        try:
+            await db.create_collection(self.name, timeseries={
+                "timeField": "d", "metaField": self.META_FIELD, "granularity": "hours",
+            })
+        except CollectionInvalid:
+            pass
+
+    async def create_index(self, keys: list):
+        await self.collection.create_index([(self._key(key), direction) for key, direction in keys])
+
+    def find(self, query: dict, projection: Optional[dict] = None):
+        if not self.timeseries:
+            return self.collection.find(query, projection)
+        query = {self._key(key): value for key, value in query.items()}
+        if projection:
+            projection = {self._key(key): value for key, value in projection.items()}
+        return SeriesCursor(self.collection.find(query, projection), self._flat)
+
+    async def insert_many(self, docs: List[dict], ordered: bool = True):
+        await self.collection.insert_many([self._stored(doc) for doc in docs], ordered=ordered)
+
+    async def delete_many(self, query: dict):
+        return await self.collection.delete_many({self._key(key): value for key, value in query.items()})
+
+
+exercise_logs = ExerciseLogStore(EXERCISE_LOGS_TIMESERIES)
+
+
+LOG_WRITE_BEHIND = os.environ.get("LOG_WRITE_BEHIND", "0") == "1"
+LOG_BUFFER_MAX_BATCH = int(os.environ.get("LOG_BUFFER_MAX_BATCH", "500"))
+LOG_BUFFER_FLUSH_SECONDS = float(os.environ.get("LOG_BUFFER_FLUSH_SECONDS", "1"))
+LOG_JOURNAL_DIR = Path(os.environ.get("LOG_JOURNAL_DIR", str(ROOT_DIR / "journal")))
+
+
+class LogWriteBuffer:
+    """Write-behind buffer for exercise log inserts, enabled with LOG_WRITE_BEHIND=1.
+
+    add() appends the log to this worker's journal file, fsyncs it and returns;
+    a background task inserts the buffered logs with one insert_many every
+    LOG_BUFFER_FLUSH_SECONDS, as soon as LOG_BUFFER_MAX_BATCH are waiting, and on
+    shutdown. Logs get their _id up front, so a journal replayed on the next start
+    deletes whatever part of it did reach Mongo before inserting it again.
+
+    Each worker locks its own journal slot in LOG_JOURNAL_DIR and, on start, also
+    replays any slot no running worker holds. Until flushed, a log is visible only
+    to the worker that buffered it, which merges its pending logs into log reads;
+    the change seq reservation covering it stays open until the flush, so
+    /api/sync on any worker holds its cursor below the log instead of skipping it.
+    """
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.pending = []
+        self.deferred_releases = []
+        self.path = None
+        self.stats = {"flushed": 0, "batches": 0, "failures": 0, "replayed": 0}
+        self._journal = None
+        self._slot_lock = None
+        self._journal_lock = asyncio.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._task = None
+        self._retrying = False
+
+    def _claim_slot(self):
+        LOG_JOURNAL_DIR.mkdir(parents=True, exist_ok=True)
+        for slot in itertools.count():
+            lock = open(LOG_JOURNAL_DIR / f"log-buffer-{slot}.lock", "wb")
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock.close()
+                continue
+            return LOG_JOURNAL_DIR / f"log-buffer-{slot}.ndjson", lock
+
+    async def _replay(self, path: Path) -> int:
+        """Insert the logs journaled in `path`, whose slot lock the caller holds, and empty it."""
+        replayed = []
+        if path.exists():
+            for line in path.read_bytes().splitlines():
+                try:
+                    replayed.append(json_util.loads(line))
+                except ValueError:
+                    # A line torn by a crash was never acknowledged.
+                    continue
+        if replayed:
+            await self._insert(replayed, clear_first=True)
+            self.stats["replayed"] += len(replayed)
+        path.write_bytes(b"")
+        return len(replayed)
+
+    async def start(self) -> int:
+        """Claim a journal slot and insert whatever previous processes left in unheld slots."""
+        if not self.enabled and not LOG_JOURNAL_DIR.exists():
+            return 0
+        self.path, self._slot_lock = self._claim_slot()
+        replayed = await self._replay(self.path)
+        for path in sorted(LOG_JOURNAL_DIR.glob("log-buffer-*.ndjson")):
+            if path == self.path:
+                continue
+            lock = open(path.with_suffix(".lock"), "wb")
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # A running worker owns this slot.
+                lock.close()
+                continue
+            try:
+                replayed += await self._replay(path)
+            finally:
+                lock.close()
+        if self.enabled:
+            self._journal = open(self.path, "ab")
+            self._task = asyncio.create_task(self._run())
+        else:
+            self._slot_lock.close()
+        return replayed
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._journal:
+            try:
+                await self.flush()
+            except Exception as exc:
+                logging.getLogger(__name__).warning("Final log flush failed, journal kept for replay: %s", exc)
+            self._journal.close()
+            self._journal = None
+            self._slot_lock.close()
+
+    async def add(self, doc: dict):
+        await self.add_many([doc])
+
+    async def add_many(self, docs: List[dict]):
+        for doc in docs:
+            doc["_id"] = ObjectId()
+        if not self._journal:
+            await exercise_logs.insert_many(docs)
+            return
+        async with self._journal_lock:
+            self._journal.write(b"".join(json_util.dumps(doc).encode() + b"\n" for doc in docs))
+            self._journal.flush()
+            await asyncio.to_thread(os.fsync, self._journal.fileno())
+            self.pending.extend(docs)
+        if len(self.pending) >= LOG_BUFFER_MAX_BATCH:
+            self._wake.set()
+
+    def pending_for(self, user_id: str) -> List[dict]:
+        return [doc for doc in self.pending if doc["u"] == user_id]
+
+    def _holds(self, user_id: str, seq: int) -> bool:
+        return any(doc["u"] == user_id and doc.get("q", 0) <= seq for doc in self.pending)
+
+    def defer_release(self, user_id: str, seq: int) -> bool:
+        """Keep the reservation up to `seq` open while any of the user's logs under it is unflushed."""
+        if not self._holds(user_id, seq):
+            return False
+        self.deferred_releases.append((user_id, seq))
+        return True
+
+    async def _insert(self, docs: List[dict], clear_first: bool):
+        if clear_first:
+            await exercise_logs.delete_many({"_id": {"$in": [doc["_id"] for doc in docs]}})
+        await exercise_logs.insert_many(docs, ordered=False)
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            batch = list(self.pending)
+            if not batch:
+                return 0
+            try:
+                # After a failed batch some of its logs may already be stored.
+                await self._insert(batch, clear_first=self._retrying)
+            except Exception:
+                self._retrying = True
+                self.stats["failures"] += 1
+                raise
+            self._retrying = False
+            async with self._journal_lock:
+                # add() only appends, so the batch is still the head of the list.
+                del self.pending[:len(batch)]
+                await asyncio.to_thread(self._rewrite_journal, list(self.pending))
+            self.stats["flushed"] += len(batch)
+            self.stats["batches"] += 1
+            ready = [r for r in self.deferred_releases if not self._holds(*r)]
+            self.deferred_releases = [r for r in self.deferred_releases if self._holds(*r)]
+            if ready:
+                await db.change_counters.bulk_write([
+                    UpdateOne({"_id": user_id}, {"$pull": {"open": {"to": seq}}}) for user_id, seq in ready
+                ], ordered=False)
+            return len(batch)
+
+    def _rewrite_journal(self, pending: List[dict]):
+        """Replace the journal with the logs still pending; atomic, so a crash keeps one of the two."""
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            f.writelines(json_util.dumps(doc).encode() + b"\n" for doc in pending)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._journal.close()
+        self._journal = open(self.path, "ab")
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), LOG_BUFFER_FLUSH_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as exc:
+                logging.getLogger(__name__).warning("Log flush failed, retrying: %s", exc)
+
+    def snapshot(self) -> dict:
+        return {
+            "enabled": self.enabled, "pending": len(self.pending), "deferred_releases": len(self.deferred_releases),
+            "journal": str(self.path), **self.stats,
+        }
+
+
+log_buffer = LogWriteBuffer(LOG_WRITE_BEHIND)
+
+
+class ExerciseNameDictionary:
+    """Small integer codes for exercise names, kept in the `exercise_names` collection.
+
+    A code never changes meaning once assigned, so workers cache the mapping for
+    their lifetime; names registered by another worker are fetched on a miss.
+    """
+
+    def __init__(self):
+        self.by_name = {}
+        self.by_code = {}
+
+    def _remember(self, code: int, name: str):
+        self.by_name[name] = code
+        self.by_code[code] = name
+
+    async def load(self):
+        async for doc in db.exercise_names.find({}):
+            self._remember(doc["_id"], doc["name"])
+
+    async def code(self, name: str) -> int:
+        if name in self.by_name:
+            return self.by_name[name]
+        doc = await db.exercise_names.find_one({"name": name})
+        if doc is None:
+            seq = await db.app_meta.find_one_and_update(
+                {"key": "exercise_name_seq"}, {"$inc": {"value": 1}},
+                upsert=True, return_document=ReturnDocument.AFTER,
+            )
+            doc = {"_id": seq["value"], "name": name}
+            try:
+                await db.exercise_names.insert_one(doc)
+            except DuplicateKeyError:
+                # Another worker registered the same name first.
+                doc = await db.exercise_names.find_one({"name": name})
+        self._remember(doc["_id"], doc["name"])
+        return doc["_id"]
+
+    async def resolve(self, codes) -> dict:
+        missing = list({code for code in codes if code not in self.by_code})
+        if missing:
+            async for doc in db.exercise_names.find({"_id": {"$in": missing}}):
+                self._remember(doc["_id"], doc["name"])
+        return self.by_code
+
+
+exercise_names = ExerciseNameDictionary()
 
 
 PROFILES = [
     {"id": "andrea", "name": "Andrea", "color": "#F59E0B"},
 ]
-WORKOUT_PLAN_VERSION = "andrea-2026-04-26"
+# Last value of the hand-bumped plan version that template hashes replaced; plans synced
+# under it match SEED_DATA and are adopted by stamping their hash, not rewritten.
+LEGACY_WORKOUT_PLAN_VERSION = "andrea-2026-04-26"
+MOVEMENT_CATALOG_VERSION = 1
+EXERCISE_LOG_SCHEMA_VERSION = 2
+SESSION_SUMMARY_VERSION = 1
+
+# Different spellings used across days for the same movement.
+MOVEMENT_ALIASES = {
+    "alzate-laterali-ai-cavi": "alzate-laterali-cavi",
+}
+
+
+def movement_id_for(name: str) -> str:
+    slug = re.sub(r'[^a-z0-9]+', '-', (name or "").strip().lower()).strip('-')
+    return MOVEMENT_ALIASES.get(slug, slug)
 
 
 class UpdateExerciseRequest(BaseModel):
@@ -89,6 +1237,19 @@ class AddExerciseRequest(BaseModel):
     notes: str = ""
 
 
+class PlanEditOperation(BaseModel):
+    op: Literal["update", "move", "insert", "delete"]
+    exercise_id: Optional[str] = None
+    # move: target index; insert: index to insert at (default: append).
+    position: Optional[int] = None
+    changes: Optional[UpdateExerciseRequest] = None
+    exercise: Optional[AddExerciseRequest] = None
+
+
+class PlanEditRequest(BaseModel):
+    operations: List[PlanEditOperation]
+
+
 class UpdateLoadRequest(BaseModel):
     load: str
 
@@ -102,6 +1263,11 @@ class ExerciseLogCreate(BaseModel):
     day_number: int = 0
 
 
+class DraftSet(BaseModel):
+    reps: int
+    load: str
+
+
 class SessionExercise(BaseModel):
     exercise_id: str
     name: str
@@ -111,9 +1277,12 @@ class SessionExercise(BaseModel):
     load: str
     muscle_group: str
     muscle_label: str
+    movement_id: str = ""
     completed: bool = True
     was_modified: bool = False
     original_name: str = ""
+    # Reps and load of each set actually done; load progression needs one per planned set.
+    completed_sets: List[DraftSet] = []
 
 
 class WorkoutSessionCreate(BaseModel):
@@ -121,12 +1290,37 @@ class WorkoutSessionCreate(BaseModel):
     day_name: str
     duration_minutes: int
     exercises: List[SessionExercise]
+    progress_loads: bool = True
 
 
 class CreateDayRequest(BaseModel):
     name: Optional[str] = None
 
 
+class StartDraftRequest(BaseModel):
+    day_number: int
+    replace: bool = False
+
+
+class DraftExercisePatch(BaseModel):
+    completed: Optional[bool] = None
+    name: Optional[str] = None
+    sets: Optional[int] = None
+    reps: Optional[int] = None
+    rep_range: Optional[str] = None
+    load: Optional[str] = None
+    muscle_group: Optional[str] = None
+    muscle_label: Optional[str] = None
+    was_modified: Optional[bool] = None
+    original_name: Optional[str] = None
+    logged_set: Optional[DraftSet] = None
+
+
+class FinishDraftRequest(BaseModel):
+    duration_minutes: Optional[int] = None
+    progress_loads: bool = True
+
+
 SEED_DATA = [
     {
         "day_number": 1,
@@ -176,7 +1370,11 @@ SEED_DATA = [
 def build_seed_plan(profile_id: str, day_data: dict) -> dict:
     exercises = []
     for idx, ex in enumerate(day_data["exercises"]):
-        exercises.append({"id": f"{profile_id}-d{day_data['day_number']}-ex{idx}", **ex})
+        exercises.append({
+            "id": f"{profile_id}-d{day_data['day_number']}-ex{idx}",
+            "movement_id": movement_id_for(ex["name"]),
+            **ex,
+        })
     return {
         "id": str(uuid.uuid4()),
         "user_id": profile_id,
@@ -186,31 +1384,402 @@ def build_seed_plan(profile_id: str, day_data: dict) -> dict:
     }
 
 
-async def sync_andrea_workout_plans():
-    current = await db.app_meta.find_one({"key": "workout_plan_version"}, {"_id": 0})
-    if current and current.get("value") == WORKOUT_PLAN_VERSION:
+async def ensure_indexes():
+    await db.app_meta.create_index("key", unique=True)
+    await db.user_analytics.create_index("user_id", unique=True)
+    await db.workout_drafts.create_index("user_id", unique=True)
+    await db.workout_drafts.create_index("id")
+    await db.exercise_catalog.create_index(
+        [("user_id", ASCENDING), ("exercise_id", ASCENDING)], unique=True
+    )
+    await db.exercise_catalog.create_index([("user_id", ASCENDING), ("movement_id", ASCENDING)])
+    await db.exercise_names.create_index("name", unique=True)
+    await exercise_logs.create()
+    await exercise_logs.create_index([("u", ASCENDING), ("e", ASCENDING), ("d", ASCENDING)])
+    await exercise_logs.create_index([("u", ASCENDING), ("m", ASCENDING), ("d", ASCENDING)])
+    await exercise_logs.create_index([("u", ASCENDING), ("q", ASCENDING)])
+    # archive_old_logs selects by date alone, across every user.
+    await exercise_logs.create_index([("d", ASCENDING)])
+    if not await db.list_collection_names(filter={"name": "exercise_logs_archive"}):
+        try:
+            # Cold rows are rarely read; trade CPU for disk.
+            await db.create_collection(
+                "exercise_logs_archive", storageEngine={"wiredTiger": {"configString": "block_compressor=zstd"}}
+            )
+        except CollectionInvalid:
+            pass
+    await db.exercise_logs_archive.create_index([("u", ASCENDING), ("e", ASCENDING), ("d", ASCENDING)])
+    await db.exercise_log_rollups.create_index(
+        [("user_id", ASCENDING), ("exercise_id", ASCENDING), ("month", ASCENDING)], unique=True
+    )
+    await db.exercise_log_rollups.create_index(
+        [("user_id", ASCENDING), ("movement_id", ASCENDING), ("month", ASCENDING)]
+    )
+    await db.workout_plans.create_index([("user_id", ASCENDING), ("seq", ASCENDING)])
+    await db.workout_sessions.create_index([("user_id", ASCENDING), ("seq", ASCENDING)])
+    await db.tombstones.create_index([("user_id", ASCENDING), ("seq", ASCENDING)])
+    try:
+        await db.idempotency_keys.create_index("created_at", expireAfterSeconds=IDEMPOTENCY_TTL_SECONDS)
+    except OperationFailure as exc:
+        if exc.code != 85:  # IndexOptionsConflict: the TTL setting changed
+            raise
+        await db.command("collMod", "idempotency_keys", index={
+            "keyPattern": {"created_at": 1}, "expireAfterSeconds": IDEMPOTENCY_TTL_SECONDS,
+        })
+    await db.workout_sessions.create_index(
+        [("user_id", ASCENDING), ("exercises.movement_id", ASCENDING), ("completed_at", DESCENDING)]
+    )
+    # Wide enough to cover history lists requested with `fields=` (e.g. id,day_name,completed_at).
+    await db.workout_sessions.create_index([
+        ("user_id", ASCENDING), ("completed_at", DESCENDING), ("id", ASCENDING), ("day_number", ASCENDING),
+        ("day_name", ASCENDING), ("duration_minutes", ASCENDING), ("report.total_volume", ASCENDING),
+    ])
+    await db.workout_sessions.create_index(
+        [("user_id", ASCENDING), ("day_number", ASCENDING), ("completed_at", DESCENDING)]
+    )
+    await db.session_summaries.create_index("id", unique=True)
+    # Every summary field is in the key, so the history list never fetches a document.
+    await db.session_summaries.create_index(
+        [("user_id", ASCENDING), ("completed_at", DESCENDING)]
+        + [(field, ASCENDING) for field in SESSION_SUMMARY_FIELDS if field != "completed_at"]
+    )
+
+
+# A reservation not released within this long is taken to belong to a write that failed.
+CHANGE_RESERVATION_TIMEOUT_SECONDS = float(os.environ.get("CHANGE_RESERVATION_TIMEOUT_SECONDS", "300"))
+
+
+async def next_change_seq(user_id: str, count: int = 1) -> int:
+    """Reserve `count` numbers of the user's change sequence and return the highest.
+
+    Every write to a user's plans, sessions or logs stores its number in `seq`
+    (`q` on compact logs), which is what GET /api/sync pages on. The reservation
+    stays listed in the counter's `open` until release_change_seq() is called
+    with the returned number, and sync never hands out a cursor past it.
+    """
+    now = time.time()
+    current = {"$ifNull": ["$seq", 0]}
+    counter = await db.change_counters.find_one_and_update(
+        {"_id": user_id},
+        [
+            {"$set": {"open": {"$concatArrays": [
+                {"$filter": {
+                    "input": {"$ifNull": ["$open", []]}, "cond": {
+                        "$gte": ["$$this.at", now - CHANGE_RESERVATION_TIMEOUT_SECONDS]
+                    },
+                }},
+                [{"from": {"$add": [current, 1]}, "to": {"$add": [current, count]}, "at": now}],
+            ]}}},
+            {"$set": {"seq": {"$add": [current, count]}}},
+        ],
+        upsert=True, return_document=ReturnDocument.AFTER,
+    )
+    return counter["seq"]
+
+
+async def release_change_seq(user_id: str, seq: int):
+    """Close the reservation next_change_seq() returned `seq` for; its writes have landed or failed.
+
+    Logs still in the write-behind buffer have not landed; their flush closes it instead.
+    """
+    if log_buffer.defer_release(user_id, seq):
+        return
+    await db.change_counters.update_one({"_id": user_id}, {"$pull": {"open": {"to": seq}}})
+
+
+def settled_change_seq(counter: Optional[dict]) -> int:
+    """The highest change seq below every open reservation, so everything up to it is written."""
+    if not counter:
+        return 0
+    cutoff = time.time() - CHANGE_RESERVATION_TIMEOUT_SECONDS
+    return min([counter["seq"], *(r["from"] - 1 for r in counter.get("open", []) if r["at"] >= cutoff)])
+
+
+async def record_tombstone(user_id: str, kind: str, **fields):
+    seq = await next_change_seq(user_id)
+    try:
+        await db.tombstones.insert_one({
+            "user_id": user_id,
+            "seq": seq,
+            "kind": kind,
+            "deleted_at": datetime.now(timezone.utc).isoformat(),
+            **fields,
+        })
+    finally:
+        await release_change_seq(user_id, seq)
+
+
+def catalog_upsert(user_id: str, day_number: int, ex: dict) -> UpdateOne:
+    return UpdateOne(
+        {"user_id": user_id, "exercise_id": ex["id"]},
+        {"$set": {
+            "movement_id": ex.get("movement_id") or movement_id_for(ex["name"]),
+            "name": ex["name"],
+            "day_number": day_number,
+        }},
+        upsert=True,
+    )
+
+
+async def upsert_catalog_entries(user_id: str, day_number: int, exercises: List[dict]):
+    if not exercises:
+        return
+    # Register names up front so logging a plan exercise never has to allocate a code.
+    for name in {ex["name"] for ex in exercises}:
+        await exercise_names.code(name)
+    await db.exercise_catalog.bulk_write(
+        [catalog_upsert(user_id, day_number, ex) for ex in exercises], ordered=False
+    )
+
+
+async def lookup_movement_ids(user_id: str, exercises: List[dict]) -> dict:
+    """Map exercise ids to movement ids, falling back to the exercise name."""
+    ids = [ex["exercise_id"] for ex in exercises]
+    entries = await db.exercise_catalog.find(
+        {"user_id": user_id, "exercise_id": {"$in": ids}}, {"_id": 0, "exercise_id": 1, "movement_id": 1}
+    ).to_list(len(ids))
+    found = {e["exercise_id"]: e["movement_id"] for e in entries}
+    return {ex["exercise_id"]: found.get(ex["exercise_id"]) or movement_id_for(ex["name"]) for ex in exercises}
+
+
+async def backfill_movement_catalog():
+    current = await db.app_meta.find_one({"key": "movement_catalog_version"}, {"_id": 0})
+    if current and current.get("value") == MOVEMENT_CATALOG_VERSION:
         return False
 
-    for day_data in SEED_DATA:
-        plan = build_seed_plan("andrea", day_data)
+    catalog = {}
+    async for plan in db.workout_plans.find({}, {"_id": 0, "user_id": 1, "day_number": 1, "exercises": 1}):
+        for ex in plan["exercises"]:
+            ex.setdefault("movement_id", movement_id_for(ex["name"]))
+            catalog[(plan["user_id"], ex["id"])] = ex["movement_id"]
         await db.workout_plans.update_one(
-            {"user_id": "andrea", "day_number": day_data["day_number"]},
-            {"$set": {
-                "user_id": plan["user_id"],
-                "day_number": plan["day_number"],
-                "name": plan["name"],
-                "exercises": plan["exercises"],
-            }, "$setOnInsert": {"id": plan["id"]}},
-            upsert=True,
+            {"user_id": plan["user_id"], "day_number": plan["day_number"]},
+            {"$set": {"exercises": plan["exercises"]}, "$inc": {"version": 1}},
+        )
+        await upsert_catalog_entries(plan["user_id"], plan["day_number"], plan["exercises"])
+
+    log_groups = await db.exercise_logs.aggregate([
+        {"$match": {"user_id": {"$exists": True}, "movement_id": {"$exists": False}}},
+        {"$group": {"_id": {"user_id": "$user_id", "exercise_id": "$exercise_id"},
+                    "name": {"$last": "$exercise_name"}}},
+    ]).to_list(None)
+    log_updates = [
+        UpdateMany(
+            {"user_id": g["_id"]["user_id"], "exercise_id": g["_id"]["exercise_id"],
+             "movement_id": {"$exists": False}},
+            {"$set": {"movement_id": catalog.get((g["_id"]["user_id"], g["_id"]["exercise_id"]))
+                      or movement_id_for(g["name"])}},
         )
+        for g in log_groups
+    ]
+    if log_updates:
+        await db.exercise_logs.bulk_write(log_updates, ordered=False)
+
+    session_updates = []
+    async for s in db.workout_sessions.find(
+        {"exercises.movement_id": {"$exists": False}}, {"_id": 0, "id": 1, "user_id": 1, "exercises": 1}
+    ):
+        for ex in s["exercises"]:
+            ex["movement_id"] = catalog.get((s["user_id"], ex["exercise_id"])) or movement_id_for(ex["name"])
+        session_updates.append(UpdateOne({"id": s["id"]}, {"$set": {"exercises": s["exercises"]}}))
+        if len(session_updates) >= 500:
+            await db.workout_sessions.bulk_write(session_updates, ordered=False)
+            session_updates = []
+    if session_updates:
+        await db.workout_sessions.bulk_write(session_updates, ordered=False)
+    user_cache.clear()
+
+    await db.app_meta.update_one(
+        {"key": "movement_catalog_version"},
+        {"$set": {"value": MOVEMENT_CATALOG_VERSION, "updated_at": datetime.now(timezone.utc).isoformat()}},
+        upsert=True,
+    )
+    return True
+
+
+async def compact_exercise_logs():
+    """Rewrite logs still in the verbose schema (uuid id, exercise_name, ISO date) in place."""
+    current = await db.app_meta.find_one({"key": "exercise_log_schema_version"}, {"_id": 0})
+    if current and current.get("value") == EXERCISE_LOG_SCHEMA_VERSION:
+        return False
+
+    updates = []
+    async for log in db.exercise_logs.find({"user_id": {"$exists": True}}):
+        updates.append(ReplaceOne(
+            {"_id": log["_id"]}, encode_log(log, await exercise_names.code(log.get("exercise_name", "")))
+        ))
+        if len(updates) >= 500:
+            await db.exercise_logs.bulk_write(updates, ordered=False)
+            updates = []
+    if updates:
+        await db.exercise_logs.bulk_write(updates, ordered=False)
+    for index in ("user_id_1_exercise_id_1_date_1", "user_id_1_movement_id_1_date_1"):
+        try:
+            await db.exercise_logs.drop_index(index)
+        except OperationFailure:
+            pass
+    user_cache.clear()
+
+    await db.app_meta.update_one(
+        {"key": "exercise_log_schema_version"},
+        {"$set": {"value": EXERCISE_LOG_SCHEMA_VERSION, "updated_at": datetime.now(timezone.utc).isoformat()}},
+        upsert=True,
+    )
+    return True
+
+
+LOG_MIGRATION_BATCH = 5000
+
+
+async def migrate_log_storage() -> int:
+    """Move logs left in the other storage mode's collection into the active one, then drop it.
+
+    Runs after compact_exercise_logs, so every source document is already compact.
+    Each batch is cleared from the target before it is copied, so a migration
+    interrupted between copy and delete does not double any log on the next start.
+    """
+    source = ExerciseLogStore(not exercise_logs.timeseries)
+    if not await db.list_collection_names(filter={"name": source.name}):
+        return 0
+    moved = 0
+    while True:
+        docs = await source.find({}).limit(LOG_MIGRATION_BATCH).to_list(None)
+        if not docs:
+            break
+        ids = [doc["_id"] for doc in docs]
+        await exercise_logs.delete_many({"_id": {"$in": ids}})
+        await exercise_logs.insert_many(docs, ordered=False)
+        await source.delete_many({"_id": {"$in": ids}})
+        moved += len(docs)
+    await source.collection.drop()
+    user_cache.clear()
+    return moved
+
+
+async def backfill_session_summaries():
+    current = await db.app_meta.find_one({"key": "session_summaries_version"}, {"_id": 0})
+    if current and current.get("value") == SESSION_SUMMARY_VERSION:
+        return False
+
+    updates = []
+    async for s in db.workout_sessions.find({}, {
+        "_id": 0, "id": 1, "user_id": 1, "day_number": 1, "day_name": 1, "completed_at": 1,
+        "duration_minutes": 1, "report.total_volume": 1, "report.total_exercises": 1,
+        "report.completed_exercises": 1, "report.load_changes": 1,
+    }):
+        updates.append(UpdateOne({"id": s["id"]}, {"$set": session_summary(s)}, upsert=True))
+        if len(updates) >= 500:
+            await db.session_summaries.bulk_write(updates, ordered=False)
+            updates = []
+    if updates:
+        await db.session_summaries.bulk_write(updates, ordered=False)
+    user_cache.clear()
+
     await db.app_meta.update_one(
-        {"key": "workout_plan_version"},
-        {"$set": {"value": WORKOUT_PLAN_VERSION, "updated_at": datetime.now(timezone.utc).isoformat()}},
+        {"key": "session_summaries_version"},
+        {"$set": {"value": SESSION_SUMMARY_VERSION, "updated_at": datetime.now(timezone.utc).isoformat()}},
         upsert=True,
     )
     return True
 
 
+def plan_template_hash(template) -> str:
+    return hashlib.sha256(json.dumps(template, sort_keys=True).encode()).hexdigest()[:16]
+
+
+async def adopt_legacy_plans(profile_ids: List[str], day_hashes: dict, stored: dict):
+    """Stamp template hashes on plans synced under LEGACY_WORKOUT_PLAN_VERSION, updating `stored`.
+
+    Those plans predate template hashes but already match SEED_DATA and carry the
+    users' progressed loads and edits, so they are adopted as they are.
+    """
+    legacy = await db.app_meta.find_one({"key": "workout_plan_version"}, {"_id": 0})
+    if not legacy:
+        return
+    if legacy.get("value") == LEGACY_WORKOUT_PLAN_VERSION:
+        unstamped = [key for key, template_hash in stored.items() if template_hash is None]
+        if unstamped:
+            await db.workout_plans.bulk_write([
+                UpdateMany(
+                    {"user_id": {"$in": profile_ids}, "day_number": day_number, "template_hash": None},
+                    {"$set": {"template_hash": template_hash}},
+                )
+                for day_number, template_hash in day_hashes.items()
+            ], ordered=False)
+            for key in unstamped:
+                stored[key] = day_hashes[key[1]]
+    await db.app_meta.delete_one({"key": "workout_plan_version"})
+
+
+async def sync_plan_templates(force: bool = False) -> int:
+    """Bring every profile's plans in line with SEED_DATA and return the number of days written.
+
+    Each plan day records the hash of the template it was built from, so only days
+    whose template changed are rewritten, with one unordered bulk_write per profile.
+    `force` rewrites every day, discarding edits made through the API.
+    """
+    profile_ids = [p["id"] for p in PROFILES]
+    fingerprint = plan_template_hash({"profiles": profile_ids, "days": SEED_DATA})
+    if not force:
+        current = await db.app_meta.find_one({"key": "plan_template_fingerprint"}, {"_id": 0})
+        if current and current.get("value") == fingerprint:
+            return 0
+
+    day_hashes = {day["day_number"]: plan_template_hash(day) for day in SEED_DATA}
+    stored = {}
+    async for plan in db.workout_plans.find(
+        {"user_id": {"$in": profile_ids}, "day_number": {"$in": list(day_hashes)}},
+        {"_id": 0, "user_id": 1, "day_number": 1, "template_hash": 1},
+    ):
+        stored[(plan["user_id"], plan["day_number"])] = plan.get("template_hash")
+    if not force:
+        await adopt_legacy_plans(profile_ids, day_hashes, stored)
+
+    written = 0
+    for profile_id in profile_ids:
+        plans = [
+            build_seed_plan(profile_id, day_data) for day_data in SEED_DATA
+            if force or stored.get((profile_id, day_data["day_number"])) != day_hashes[day_data["day_number"]]
+        ]
+        if not plans:
+            continue
+        last_seq = await next_change_seq(profile_id, len(plans))
+        for offset, plan in enumerate(plans):
+            plan["seq"] = last_seq - len(plans) + 1 + offset
+        try:
+            await db.workout_plans.bulk_write([
+                UpdateOne(
+                    {"user_id": profile_id, "day_number": plan["day_number"]},
+                    {"$set": {
+                        "user_id": plan["user_id"],
+                        "day_number": plan["day_number"],
+                        "name": plan["name"],
+                        "exercises": plan["exercises"],
+                        "template_hash": day_hashes[plan["day_number"]],
+                        "seq": plan["seq"],
+                    }, "$setOnInsert": {"id": plan["id"]}, "$inc": {"version": 1}},
+                    upsert=True,
+                )
+                for plan in plans
+            ], ordered=False)
+        finally:
+            await release_change_seq(profile_id, last_seq)
+        for name in {ex["name"] for plan in plans for ex in plan["exercises"]}:
+            await exercise_names.code(name)
+        await db.exercise_catalog.bulk_write([
+            catalog_upsert(profile_id, plan["day_number"], ex) for plan in plans for ex in plan["exercises"]
+        ], ordered=False)
+        invalidate_user(profile_id)
+        written += len(plans)
+
+    await db.app_meta.update_one(
+        {"key": "plan_template_fingerprint"},
+        {"$set": {"value": fingerprint, "updated_at": datetime.now(timezone.utc).isoformat()}},
+        upsert=True,
+    )
+    return written
+
+
 @api_router.get("/")
 async def root():
     return {"message": "Gym Tracker API"}
@@ -222,18 +1791,90 @@ async def get_profiles():
 
 
 @api_router.get("/workout-plans")
-async def get_workout_plans(user_id: str = Query(...)):
-    return await db.workout_plans.find({"user_id": user_id}, {"_id": 0}).sort("day_number", 1).to_list(10)
+@coalesced
+async def get_workout_plans(user_id: str = Query(...), fields: Optional[str] = Query(None)):
+    projection = build_projection(fields, PLAN_FIELDS)
+    return await db.workout_plans.find({"user_id": user_id}, projection).sort("day_number", 1).to_list(10)
+
+
+@coalesced
+async def fetch_workout_plan(day_number: int, user_id: str, fields: Optional[str] = None):
+    projection = build_projection(fields, PLAN_FIELDS)
+    plan = await db.workout_plans.find_one({"user_id": user_id, "day_number": day_number}, projection)
+    if not plan:
+        raise HTTPException(404, "Plan not found")
+    return plan
+
+
+def plan_etag(version: int) -> str:
+    return f'"{version}"'
 
 
 @api_router.get("/workout-plans/{day_number}")
-async def get_workout_plan(day_number: int, user_id: str = Query(...)):
-    plan = await db.workout_plans.find_one({"user_id": user_id, "day_number": day_number}, {"_id": 0})
+async def get_workout_plan(
+    day_number: int,
+    user_id: str = Query(...),
+    fields: Optional[str] = Query(None),
+    if_none_match: Optional[str] = Header(None),
+):
+    plan = await fetch_workout_plan(day_number, user_id=user_id, fields=fields)
+    if "version" not in plan and fields:
+        return plan
+    etag = plan_etag(plan.get("version", 0))
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return JSONResponse(plan, headers={"ETag": etag})
+
+
+def expected_plan_version(if_match: Optional[str], expected_version: Optional[int]) -> Optional[int]:
+    """The version a plan edit was based on, from `expected_version` or an If-Match ETag."""
+    if expected_version is not None:
+        return expected_version
+    if if_match is None or if_match.strip() == "*":
+        return None
+    try:
+        return int(if_match.strip().removeprefix("W/").strip('"'))
+    except ValueError:
+        raise HTTPException(400, "If-Match must be a plan ETag")
+
+
+def plan_conflict(version: int) -> HTTPException:
+    return HTTPException(409, "Plan was changed by another edit", headers={"ETag": plan_etag(version)})
+
+
+async def load_plan_for_edit(user_id: str, day_number: int, expected: Optional[int]) -> dict:
+    plan = await db.workout_plans.find_one({"user_id": user_id, "day_number": day_number})
     if not plan:
         raise HTTPException(404, "Plan not found")
+    if expected is not None and plan.get("version", 0) != expected:
+        raise plan_conflict(plan.get("version", 0))
     return plan
 
 
+async def save_plan_exercises(user_id: str, plan: dict) -> int:
+    """Write back `plan["exercises"]` only if nobody changed the plan since it was read.
+
+    Plans written before versioning have no `version`; a null match covers them.
+    Returns the new version.
+    """
+    seq = await next_change_seq(user_id)
+    try:
+        result = await db.workout_plans.update_one(
+            {"user_id": user_id, "day_number": plan["day_number"], "version": plan.get("version")},
+            {"$set": {"exercises": plan["exercises"], "seq": seq}, "$inc": {"version": 1}},
+        )
+    finally:
+        await release_change_seq(user_id, seq)
+    if result.matched_count == 0:
+        current = await db.workout_plans.find_one(
+            {"user_id": user_id, "day_number": plan["day_number"]}, {"_id": 0, "version": 1}
+        )
+        if current is None:
+            raise HTTPException(404, "Plan not found")
+        raise plan_conflict(current.get("version", 0))
+    return plan.get("version", 0) + 1
+
+
 @api_router.post("/workout-plans")
 async def create_workout_day(user_id: str = Query(...), req: CreateDayRequest = CreateDayRequest()):
     existing = await db.workout_plans.find({"user_id": user_id}, {"_id": 0}).sort("day_number", -1).to_list(10)
@@ -246,65 +1887,56 @@ async def create_workout_day(user_id: str = Query(...), req: CreateDayRequest =
         "user_id": user_id,
         "day_number": next_num,
         "name": name,
-        "exercises": []
+        "exercises": [],
+        "seq": await next_change_seq(user_id),
+        "version": 1,
     }
-    await db.workout_plans.insert_one(plan)
+    try:
+        await db.workout_plans.insert_one(plan)
+    finally:
+        await release_change_seq(user_id, plan["seq"])
+    invalidate_user(user_id)
     plan.pop("_id", None)
     return plan
 
 
 @api_router.delete("/workout-plans/{day_number}")
 async def delete_workout_day(day_number: int, user_id: str = Query(...)):
-    result = await db.workout_plans.delete_one({"user_id": user_id, "day_number": day_number})
-    if result.deleted_count == 0:
+    plan = await db.workout_plans.find_one_and_delete(
+        {"user_id": user_id, "day_number": day_number}, projection={"_id": 0, "id": 1}
+    )
+    if plan is None:
         raise HTTPException(404, "Plan not found")
+    await record_tombstone(user_id, "plan", id=plan["id"], day_number=day_number)
+    invalidate_user(user_id)
     return {"message": "Day deleted"}
 
 
-@api_router.put("/workout-plans/{day_number}/exercises/{exercise_id}")
-async def update_exercise(day_number: int, exercise_id: str, req: UpdateExerciseRequest, user_id: str = Query(...)):
-    plan = await db.workout_plans.find_one({"user_id": user_id, "day_number": day_number})
-    if not plan:
-        raise HTTPException(404, "Plan not found")
-    updated = False
-    for ex in plan["exercises"]:
-        if ex["id"] == exercise_id:
-            if req.name is not None:
-                ex["name"] = req.name
-            if req.sets is not None:
-                ex["sets"] = req.sets
-            if req.reps is not None:
-                ex["reps"] = req.reps
-            if req.rep_range is not None:
-                if req.rep_range:
-                    ex["rep_range"] = req.rep_range
-                else:
-                    ex.pop("rep_range", None)
-            if req.current_load is not None:
-                ex["current_load"] = req.current_load
-            if req.muscle_group is not None:
-                ex["muscle_group"] = req.muscle_group
-            if req.muscle_label is not None:
-                ex["muscle_label"] = req.muscle_label
-            updated = True
-            break
-    if not updated:
-        raise HTTPException(404, "Exercise not found")
-    await db.workout_plans.update_one(
-        {"user_id": user_id, "day_number": day_number},
-        {"$set": {"exercises": plan["exercises"]}}
-    )
-    return {"message": "Exercise updated"}
-
-
-@api_router.post("/workout-plans/{day_number}/exercises")
-async def add_exercise(day_number: int, req: AddExerciseRequest, user_id: str = Query(...)):
-    plan = await db.workout_plans.find_one({"user_id": user_id, "day_number": day_number})
-    if not plan:
-        raise HTTPException(404, "Plan not found")
-    ex_id = str(uuid.uuid4())[:8]
-    exercise = {
-        "id": ex_id,
+def apply_exercise_update(ex: dict, req: UpdateExerciseRequest):
+    if req.name is not None:
+        ex["name"] = req.name
+        ex["movement_id"] = movement_id_for(req.name)
+    if req.sets is not None:
+        ex["sets"] = req.sets
+    if req.reps is not None:
+        ex["reps"] = req.reps
+    if req.rep_range is not None:
+        if req.rep_range:
+            ex["rep_range"] = req.rep_range
+        else:
+            ex.pop("rep_range", None)
+    if req.current_load is not None:
+        ex["current_load"] = req.current_load
+    if req.muscle_group is not None:
+        ex["muscle_group"] = req.muscle_group
+    if req.muscle_label is not None:
+        ex["muscle_label"] = req.muscle_label
+
+
+def new_plan_exercise(req: AddExerciseRequest) -> dict:
+    return {
+        "id": str(uuid.uuid4())[:8],
+        "movement_id": movement_id_for(req.name),
         "name": req.name,
         "sets": req.sets,
         "reps": req.reps,
@@ -316,202 +1948,1289 @@ async def add_exercise(day_number: int, req: AddExerciseRequest, user_id: str =
         "muscle_label": req.muscle_label,
         "notes": req.notes,
     }
-    plan["exercises"].append(exercise)
-    await db.workout_plans.update_one(
-        {"user_id": user_id, "day_number": day_number},
-        {"$set": {"exercises": plan["exercises"]}}
+
+
+def apply_plan_operations(exercises: List[dict], operations: List[PlanEditOperation]) -> List[dict]:
+    """Apply operations in order, in place; return the exercises that need a new catalog entry.
+
+    Positions and exercise ids refer to the list as left by the previous operation.
+    Any invalid operation fails the whole batch before anything is written.
+    """
+    touched = {}
+    for i, operation in enumerate(operations):
+        index = None
+        if operation.op != "insert":
+            index = next((n for n, ex in enumerate(exercises) if ex["id"] == operation.exercise_id), None)
+            if index is None:
+                raise HTTPException(404, f"Operation {i}: exercise {operation.exercise_id} not found")
+        if operation.op == "update":
+            if operation.changes is None:
+                raise HTTPException(400, f"Operation {i}: update needs `changes`")
+            apply_exercise_update(exercises[index], operation.changes)
+            if operation.changes.name is not None:
+                touched[operation.exercise_id] = exercises[index]
+        elif operation.op == "move":
+            if operation.position is None or not 0 <= operation.position < len(exercises):
+                raise HTTPException(400, f"Operation {i}: move needs a position between 0 and {len(exercises) - 1}")
+            exercises.insert(operation.position, exercises.pop(index))
+        elif operation.op == "insert":
+            if operation.exercise is None:
+                raise HTTPException(400, f"Operation {i}: insert needs `exercise`")
+            position = len(exercises) if operation.position is None else operation.position
+            if not 0 <= position <= len(exercises):
+                raise HTTPException(400, f"Operation {i}: insert position must be between 0 and {len(exercises)}")
+            exercise = new_plan_exercise(operation.exercise)
+            exercises.insert(position, exercise)
+            touched[exercise["id"]] = exercise
+        else:
+            touched.pop(exercises.pop(index)["id"], None)
+    return list(touched.values())
+
+
+@api_router.patch("/workout-plans/{day_number}/exercises")
+async def edit_plan_exercises(
+    day_number: int,
+    req: PlanEditRequest,
+    user_id: str = Query(...),
+    expected_version: Optional[int] = Query(None),
+    if_match: Optional[str] = Header(None),
+):
+    """Update, move, insert and delete exercises of one day in a single conditional write."""
+    if not req.operations:
+        raise HTTPException(400, "No operations")
+    plan = await load_plan_for_edit(user_id, day_number, expected_plan_version(if_match, expected_version))
+    catalog = apply_plan_operations(plan["exercises"], req.operations)
+    version = await save_plan_exercises(user_id, plan)
+    invalidate_user(user_id)
+    await upsert_catalog_entries(user_id, day_number, catalog)
+    return JSONResponse(
+        {"message": "Plan updated", "version": version, "exercises": plan["exercises"]},
+        headers={"ETag": plan_etag(version)},
     )
-    return exercise
+
+
+@api_router.put("/workout-plans/{day_number}/exercises/{exercise_id}")
+async def update_exercise(
+    day_number: int,
+    exercise_id: str,
+    req: UpdateExerciseRequest,
+    user_id: str = Query(...),
+    expected_version: Optional[int] = Query(None),
+    if_match: Optional[str] = Header(None),
+):
+    plan = await load_plan_for_edit(user_id, day_number, expected_plan_version(if_match, expected_version))
+    ex = next((ex for ex in plan["exercises"] if ex["id"] == exercise_id), None)
+    if ex is None:
+        raise HTTPException(404, "Exercise not found")
+    apply_exercise_update(ex, req)
+    version = await save_plan_exercises(user_id, plan)
+    invalidate_user(user_id)
+    if req.name is not None:
+        await upsert_catalog_entries(user_id, day_number, [ex])
+    return JSONResponse({"message": "Exercise updated", "version": version}, headers={"ETag": plan_etag(version)})
+
+
+@api_router.post("/workout-plans/{day_number}/exercises")
+async def add_exercise(
+    day_number: int,
+    req: AddExerciseRequest,
+    user_id: str = Query(...),
+    expected_version: Optional[int] = Query(None),
+    if_match: Optional[str] = Header(None),
+):
+    plan = await load_plan_for_edit(user_id, day_number, expected_plan_version(if_match, expected_version))
+    exercise = new_plan_exercise(req)
+    plan["exercises"].append(exercise)
+    version = await save_plan_exercises(user_id, plan)
+    invalidate_user(user_id)
+    await upsert_catalog_entries(user_id, day_number, [exercise])
+    return JSONResponse(exercise, headers={"ETag": plan_etag(version)})
 
 
 @api_router.delete("/workout-plans/{day_number}/exercises/{exercise_id}")
-async def delete_exercise(day_number: int, exercise_id: str, user_id: str = Query(...)):
-    plan = await db.workout_plans.find_one({"user_id": user_id, "day_number": day_number})
-    if not plan:
-        raise HTTPException(404, "Plan not found")
+async def delete_exercise(
+    day_number: int,
+    exercise_id: str,
+    user_id: str = Query(...),
+    expected_version: Optional[int] = Query(None),
+    if_match: Optional[str] = Header(None),
+):
+    plan = await load_plan_for_edit(user_id, day_number, expected_plan_version(if_match, expected_version))
     original_len = len(plan["exercises"])
     plan["exercises"] = [ex for ex in plan["exercises"] if ex["id"] != exercise_id]
     if len(plan["exercises"]) == original_len:
         raise HTTPException(404, "Exercise not found")
-    await db.workout_plans.update_one(
-        {"user_id": user_id, "day_number": day_number},
-        {"$set": {"exercises": plan["exercises"]}}
+    version = await save_plan_exercises(user_id, plan)
+    invalidate_user(user_id)
+    return JSONResponse({"message": "Exercise deleted", "version": version}, headers={"ETag": plan_etag(version)})
+
+
+async def set_plan_exercise_load(
+    user_id: str, day_number: int, exercise_id: str, load: str, seq: int
+) -> Optional[tuple]:
+    """Set one exercise's current_load in place.
+
+    Returns the exercise as it was and the plan's new version, or None if the day
+    or the exercise does not exist. The version moves like any other plan edit,
+    so the caller hands it back to the client for its next If-Match.
+    """
+    plan = await db.workout_plans.find_one_and_update(
+        {"user_id": user_id, "day_number": day_number, "exercises.id": exercise_id},
+        {"$set": {"exercises.$[ex].current_load": load, "seq": seq}, "$inc": {"version": 1}},
+        array_filters=[{"ex.id": exercise_id}],
+        projection={"_id": 0, "version": 1, "exercises.id": 1, "exercises.name": 1, "exercises.movement_id": 1},
     )
-    return {"message": "Exercise deleted"}
+    if plan is None:
+        return None
+    ex = next(ex for ex in plan["exercises"] if ex["id"] == exercise_id)
+    return ex, plan.get("version", 0) + 1
 
 
 @api_router.put("/workout-plans/{day_number}/exercises/{exercise_id}/load")
 async def update_exercise_load(day_number: int, exercise_id: str, req: UpdateLoadRequest, user_id: str = Query(...)):
-    plan = await db.workout_plans.find_one({"user_id": user_id, "day_number": day_number})
-    if not plan:
-        raise HTTPException(404, "Plan not found")
-    ex_name = ""
-    for ex in plan["exercises"]:
-        if ex["id"] == exercise_id:
-            ex["current_load"] = req.load
-            ex_name = ex["name"]
-            break
-    else:
-        raise HTTPException(404, "Exercise not found")
-    await db.workout_plans.update_one(
-        {"user_id": user_id, "day_number": day_number},
-        {"$set": {"exercises": plan["exercises"]}}
+    seq = await next_change_seq(user_id, 2)
+    try:
+        updated = await set_plan_exercise_load(user_id, day_number, exercise_id, req.load, seq - 1)
+        if updated is None:
+            if await db.workout_plans.find_one({"user_id": user_id, "day_number": day_number}, {"_id": 1}):
+                raise HTTPException(404, "Exercise not found")
+            raise HTTPException(404, "Plan not found")
+        ex, version = updated
+        log_doc = {
+            "user_id": user_id,
+            "exercise_id": exercise_id,
+            "movement_id": ex.get("movement_id") or movement_id_for(ex["name"]),
+            "exercise_name": ex["name"],
+            "load": req.load,
+            "date": datetime.now(timezone.utc),
+            "day_number": day_number,
+            "seq": seq,
+        }
+        await log_buffer.add(encode_log(log_doc, await exercise_names.code(ex["name"])))
+    finally:
+        await release_change_seq(user_id, seq)
+    invalidate_user(user_id)
+    live_events.publish(user_id, "load", {"day_number": day_number, "exercise_id": exercise_id, "load": req.load})
+    return JSONResponse(
+        {"message": "Load updated", "new_load": req.load, "version": version},
+        headers={"ETag": plan_etag(version)},
     )
-    log_doc = {
-        "id": str(uuid.uuid4()),
-        "user_id": user_id,
-        "exercise_id": exercise_id,
-        "exercise_name": ex_name,
-        "load": req.load,
-        "date": datetime.now(timezone.utc).isoformat(),
-        "day_number": day_number
-    }
-    await db.exercise_logs.insert_one(log_doc)
-    return {"message": "Load updated", "new_load": req.load}
 
 
 @api_router.post("/exercise-logs")
-async def create_exercise_log(log: ExerciseLogCreate, user_id: str = Query(...)):
-    log_id = str(uuid.uuid4())
-    log_doc = {
-        "id": log_id,
-        "user_id": user_id,
-        "exercise_id": log.exercise_id,
-        "exercise_name": log.exercise_name,
-        "load": log.load,
-        "sets": log.sets,
-        "reps": log.reps,
-        "date": datetime.now(timezone.utc).isoformat(),
-        "day_number": log.day_number
-    }
-    await db.exercise_logs.insert_one(log_doc)
-    if log.day_number > 0:
-        plan = await db.workout_plans.find_one({"user_id": user_id, "day_number": log.day_number})
-        if plan:
-            for ex in plan["exercises"]:
-                if ex["id"] == log.exercise_id:
-                    ex["current_load"] = log.load
-                    break
-            await db.workout_plans.update_one(
-                {"user_id": user_id, "day_number": log.day_number},
-                {"$set": {"exercises": plan["exercises"]}}
+@idempotent("exercise-logs")
+async def create_exercise_log(
+    log: ExerciseLogCreate,
+    user_id: str = Query(...),
+    idempotency_key: Optional[str] = Header(None),
+):
+    ex, plan_version = None, None
+    seq = await next_change_seq(user_id, 2)
+    try:
+        if log.day_number > 0:
+            ex, plan_version = await set_plan_exercise_load(
+                user_id, log.day_number, log.exercise_id, log.load, seq - 1
+            ) or (None, None)
+        if ex and ex.get("movement_id"):
+            movement_id = ex["movement_id"]
+        else:
+            movement_ids = await lookup_movement_ids(
+                user_id, [{"exercise_id": log.exercise_id, "name": log.exercise_name}]
             )
-    return await db.exercise_logs.find_one({"id": log_id}, {"_id": 0})
+            movement_id = movement_ids[log.exercise_id]
+        name_code = await exercise_names.code(log.exercise_name)
+        stored = encode_log({
+            "user_id": user_id,
+            "exercise_id": log.exercise_id,
+            "movement_id": movement_id,
+            "exercise_name": log.exercise_name,
+            "load": log.load,
+            "sets": log.sets,
+            "reps": log.reps,
+            "date": datetime.now(timezone.utc),
+            "day_number": log.day_number,
+            "seq": seq,
+        }, name_code)
+        await log_buffer.add(stored)
+    finally:
+        await release_change_seq(user_id, seq)
+    invalidate_user(user_id)
+    log_doc = decode_log(stored, {name_code: log.exercise_name})
+    live_events.publish(user_id, "log", log_doc)
+    if plan_version is not None:
+        # The plan's version moved with its current_load; the client needs it for its next edit.
+        return {**log_doc, "plan_version": plan_version}
+    return log_doc
+
+
+def requested_log_fields(fields: Optional[str]) -> set:
+    return {path.split(".")[0] for path in build_projection(fields, LOG_FIELDS) if path != "_id"}
+
+
+def rollup_as_log(rollup: dict, fields: Optional[str]) -> dict:
+    """Present a monthly rollup as a log entry (last load of the month) flagged `rollup`."""
+    date = rollup.pop("last_date")
+    log = {
+        **rollup,
+        "load": rollup["last_load"],
+        "date": (date if date.tzinfo else date.replace(tzinfo=timezone.utc)).isoformat(),
+    }
+    if fields:
+        requested = requested_log_fields(fields)
+        log = {key: value for key, value in log.items() if key in requested}
+    return {**log, "rollup": True}
+
+
+async def find_logs(user_id: str, field: str, value: str, fields: Optional[str]) -> List[dict]:
+    """Raw logs for one exercise or movement, preceded by monthly rollups of archived ones."""
+    key = LOG_KEYS[field]
+    # Taken before the query: a log flushed meanwhile is then in one of the two, deduplicated by _id.
+    buffered = [doc for doc in log_buffer.pending_for(user_id) if doc.get(key) == value]
+    projection = log_projection(fields)
+    if buffered and projection:
+        projection = {**projection, "_id": 1}
+    docs, rollups = await asyncio.gather(
+        exercise_logs.find({"u": user_id, key: value}, projection).sort("d", 1).to_list(1000),
+        db.exercise_log_rollups.find({"user_id": user_id, field: value}, {"_id": 0}).sort("month", 1).to_list(1000),
+    )
+    if buffered:
+        stored = {doc["_id"] for doc in docs}
+        docs += [doc for doc in buffered if doc["_id"] not in stored]
+    names = await exercise_names.resolve(doc["n"] for doc in docs if "n" in doc)
+    logs = [decode_log(doc, names) for doc in docs]
+    if buffered and fields:
+        requested = requested_log_fields(fields)
+        logs = [{k: v for k, v in log.items() if k in requested} for log in logs]
+    return [rollup_as_log(r, fields) for r in rollups] + logs
 
 
 @api_router.get("/exercise-logs/{exercise_id}")
-async def get_exercise_logs(exercise_id: str, user_id: str = Query(...)):
-    return await db.exercise_logs.find(
-        {"user_id": user_id, "exercise_id": exercise_id}, {"_id": 0}
-    ).sort("date", 1).to_list(1000)
-
-
-@api_router.post("/workout-sessions")
-async def create_workout_session(session: WorkoutSessionCreate, user_id: str = Query(...)):
-    prev = await db.workout_sessions.find_one(
-        {"user_id": user_id, "day_number": session.day_number}, {"_id": 0},
-        sort=[("completed_at", -1)]
-    )
+@coalesced
+async def get_exercise_logs(
+    exercise_id: str,
+    user_id: str = Query(...),
+    across_days: bool = Query(False),
+    fields: Optional[str] = Query(None),
+):
+    if across_days:
+        entry = await db.exercise_catalog.find_one(
+            {"user_id": user_id, "exercise_id": exercise_id}, {"_id": 0, "movement_id": 1}
+        )
+        if entry:
+            return await get_movement_logs(entry["movement_id"], user_id=user_id, fields=fields)
+    return await find_logs(user_id, "exercise_id", exercise_id, fields)
+
+
+@api_router.get("/movements")
+@coalesced
+async def get_movements(user_id: str = Query(...)):
+    return await db.exercise_catalog.aggregate([
+        {"$match": {"user_id": user_id}},
+        {"$sort": {"day_number": 1}},
+        {"$group": {"_id": "$movement_id", "name": {"$first": "$name"}, "exercise_ids": {"$push": "$exercise_id"}}},
+        {"$project": {"_id": 0, "movement_id": "$_id", "name": 1, "exercise_ids": 1}},
+        {"$sort": {"movement_id": 1}},
+    ]).to_list(None)
+
+
+@api_router.get("/movements/{movement_id}/logs")
+@coalesced
+async def get_movement_logs(movement_id: str, user_id: str = Query(...), fields: Optional[str] = Query(None)):
+    return await find_logs(user_id, "movement_id", movement_id, fields)
+
+
+@api_router.get("/movements/{movement_id}/sessions")
+@coalesced
+async def get_movement_sessions(movement_id: str, user_id: str = Query(...)):
+    return await db.workout_sessions.aggregate([
+        {"$match": {"user_id": user_id, "exercises.movement_id": movement_id}},
+        {"$sort": {"completed_at": 1}},
+        {"$unwind": "$exercises"},
+        {"$match": {"exercises.movement_id": movement_id}},
+        {"$project": {
+            "_id": 0,
+            "session_id": "$id",
+            "day_number": 1,
+            "completed_at": 1,
+            "exercise_id": "$exercises.exercise_id",
+            "name": "$exercises.name",
+            "sets": "$exercises.sets",
+            "reps": "$exercises.reps",
+            "load": "$exercises.load",
+            "completed": "$exercises.completed",
+        }},
+    ]).to_list(1000)
+
+
+def build_session_report(exercises: List[dict], prev_exercises: Optional[List[dict]]) -> dict:
     load_changes = []
-    if prev:
-        prev_map = {ex["exercise_id"]: ex for ex in prev["exercises"]}
-        for ex in session.exercises:
-            if ex.exercise_id in prev_map:
-                prev_load = parse_load(prev_map[ex.exercise_id]["load"])
-                curr_load = parse_load(ex.load)
+    if prev_exercises:
+        prev_map = {ex["exercise_id"]: ex for ex in prev_exercises}
+        for ex in exercises:
+            if ex["exercise_id"] in prev_map:
+                prev_load = parse_load(prev_map[ex["exercise_id"]]["load"])
+                curr_load = parse_load(ex["load"])
                 if prev_load > 0 and curr_load != prev_load:
                     pct = round(((curr_load - prev_load) / prev_load) * 100, 1)
                     load_changes.append({
-                        "exercise_name": ex.name,
-                        "previous_load": prev_map[ex.exercise_id]["load"],
-                        "current_load": ex.load,
+                        "exercise_name": ex["name"],
+                        "previous_load": prev_map[ex["exercise_id"]]["load"],
+                        "current_load": ex["load"],
                         "change_pct": pct
                     })
     total_volume = sum(
-        ex.sets * ex.reps * parse_load(ex.load)
-        for ex in session.exercises if ex.completed
+        ex["sets"] * ex["reps"] * parse_load(ex["load"])
+        for ex in exercises if ex["completed"]
     )
-    report = {
+    return {
         "total_volume": total_volume,
-        "total_exercises": len(session.exercises),
-        "completed_exercises": sum(1 for ex in session.exercises if ex.completed),
+        "total_exercises": len(exercises),
+        "completed_exercises": sum(1 for ex in exercises if ex["completed"]),
         "load_changes": load_changes
     }
-    session_doc = {
+
+
+def session_summary(session: dict) -> dict:
+    """Flat row for history lists; every field is part of the session_summaries index."""
+    report = session.get("report") or {}
+    return {
+        "id": session["id"],
+        "user_id": session["user_id"],
+        "day_number": session["day_number"],
+        "day_name": session["day_name"],
+        "completed_at": session["completed_at"],
+        "duration_minutes": session["duration_minutes"],
+        "completed_exercises": report.get("completed_exercises", 0),
+        "total_exercises": report.get("total_exercises", 0),
+        "total_volume": report.get("total_volume", 0),
+        "load_change_count": len(report.get("load_changes", [])),
+    }
+
+
+_transactions_supported = None
+
+
+async def transactions_supported() -> bool:
+    """Multi-document transactions need a replica set or mongos; standalone servers reject them."""
+    global _transactions_supported
+    if _transactions_supported is None:
+        hello = await client.admin.command("hello")
+        _transactions_supported = bool(hello.get("setName")) or hello.get("msg") == "isdbgrid"
+    return _transactions_supported
+
+
+async def insert_session_with_summary(session_doc: dict):
+    summary = session_summary(session_doc)
+    if not await transactions_supported():
+        await db.workout_sessions.insert_one(session_doc)
+        await db.session_summaries.insert_one(summary)
+        return
+
+    async def write(s):
+        await db.workout_sessions.insert_one(session_doc, session=s)
+        await db.session_summaries.insert_one(summary, session=s)
+
+    async with await client.start_session() as s:
+        await s.with_transaction(write)
+
+
+def achieved_reps(ex: dict) -> int:
+    """Reps reached in every set: the weakest logged set, or 0 unless every planned set was logged.
+
+    The exercise's own `reps` is the plan's target, not a result, so it never counts.
+    """
+    sets = ex.get("completed_sets") or []
+    if not sets or len(sets) < ex["sets"]:
+        return 0
+    return min(s["reps"] for s in sets)
+
+
+def plan_progressions(exercises: List[dict]) -> List[dict]:
+    """Double progression: a completed exercise whose every logged set reached the top of its rep
+    range moves up one load step; below the top the load stays and the reps are left to grow."""
+    changes = []
+    for ex in exercises:
+        if not ex.get("completed") or ex.get("was_modified") or not REP_RANGE_RE.match(ex.get("rep_range") or ""):
+            continue
+        load = parse_load(ex["load"])
+        if load <= 0 or achieved_reps(ex) < rep_bounds(ex)[1]:
+            continue
+        changes.append({
+            "exercise_id": ex["exercise_id"],
+            "name": ex["name"],
+            "previous_load": ex["load"],
+            "new_load": re.sub(r'\d+(\.\d+)?', f"{load + load_step(load):g}", ex["load"], count=1),
+        })
+    return changes
+
+
+async def apply_progressions(user_id: str, day_number: int, changes: List[dict], first_seq: int) -> List[dict]:
+    """Write load changes into the day's plan with one update and log them with one insert.
+
+    An exercise whose plan load no longer matches the session's (edited meanwhile)
+    is left alone. Returns the changes that were applied.
+    """
+    matches = [{"id": c["exercise_id"], "current_load": c["previous_load"]} for c in changes]
+    before = await db.workout_plans.find_one_and_update(
+        {"user_id": user_id, "day_number": day_number, "exercises": {"$elemMatch": {"$or": matches}}},
+        {
+            "$set": {
+                **{f"exercises.$[p{i}].current_load": c["new_load"] for i, c in enumerate(changes)},
+                "seq": first_seq,
+            },
+            "$inc": {"version": 1},
+        },
+        array_filters=[{f"p{i}.id": m["id"], f"p{i}.current_load": m["current_load"]} for i, m in enumerate(matches)],
+        projection={"_id": 0, "exercises.id": 1, "exercises.current_load": 1, "exercises.movement_id": 1},
+    )
+    if before is None:
+        return []
+    plan_exercises = {ex["id"]: ex for ex in before["exercises"]}
+    applied = [
+        c for c in changes
+        if plan_exercises.get(c["exercise_id"], {}).get("current_load") == c["previous_load"]
+    ]
+    now = datetime.now(timezone.utc)
+    await log_buffer.add_many([
+        encode_log({
+            "user_id": user_id,
+            "exercise_id": c["exercise_id"],
+            "movement_id": plan_exercises[c["exercise_id"]].get("movement_id") or movement_id_for(c["name"]),
+            "exercise_name": c["name"],
+            "load": c["new_load"],
+            "date": now,
+            "day_number": day_number,
+            "seq": first_seq + 1 + i,
+        }, await exercise_names.code(c["name"]))
+        for i, c in enumerate(applied)
+    ])
+    for c in applied:
+        live_events.publish(user_id, "load", {
+            "day_number": day_number, "exercise_id": c["exercise_id"], "load": c["new_load"],
+        })
+    return applied
+
+
+async def store_workout_session(
+    user_id: str, day_number: int, day_name: str, duration_minutes: int, exercises: List[dict],
+    progress_loads: bool = True,
+) -> dict:
+    changes = plan_progressions(exercises) if progress_loads else []
+    # One number for the session, then one for the plan and one per load log.
+    extra = len(changes) + 1 if changes else 0
+    prev, top_seq = await asyncio.gather(
+        db.workout_sessions.find_one(
+            {"user_id": user_id, "day_number": day_number}, {"_id": 0, "exercises": 1},
+            sort=[("completed_at", -1)]
+        ),
+        next_change_seq(user_id, 1 + extra),
+    )
+    seq = top_seq - extra
+    try:
+        missing = [ex for ex in exercises if not ex.get("movement_id")]
+        if missing:
+            movement_ids = await lookup_movement_ids(user_id, missing)
+            for ex in missing:
+                ex["movement_id"] = movement_ids[ex["exercise_id"]]
+        session_doc = {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "day_number": day_number,
+            "day_name": day_name,
+            "completed_at": datetime.now(timezone.utc).isoformat(),
+            "duration_minutes": duration_minutes,
+            "exercises": exercises,
+            "report": build_session_report(exercises, prev["exercises"] if prev else None),
+            "seq": seq,
+        }
+        await insert_session_with_summary(session_doc)
+        progression = []
+        if changes:
+            # The session is stored; a failed progression must not make the client retry it.
+            try:
+                progression = await apply_progressions(user_id, day_number, changes, seq + 1)
+            except Exception as exc:
+                logging.getLogger(__name__).warning(
+                    "Load progression failed for %s day %s: %s", user_id, day_number, exc
+                )
+    finally:
+        await release_change_seq(user_id, top_seq)
+    invalidate_user(user_id)
+    live_events.publish(user_id, "session", session_summary(session_doc))
+    session_doc.pop("_id", None)
+    return {**session_doc, "progression": progression}
+
+
+@api_router.post("/workout-sessions")
+@idempotent("workout-sessions")
+async def create_workout_session(
+    session: WorkoutSessionCreate,
+    user_id: str = Query(...),
+    idempotency_key: Optional[str] = Header(None),
+):
+    return await store_workout_session(
+        user_id, session.day_number, session.day_name, session.duration_minutes,
+        [ex.model_dump() for ex in session.exercises], session.progress_loads,
+    )
+
+
+def draft_exercise(ex: dict) -> dict:
+    return {
+        "exercise_id": ex["id"],
+        "name": ex["name"],
+        "sets": ex["sets"],
+        "reps": ex["reps"],
+        "rep_range": ex.get("rep_range", ""),
+        "load": ex["current_load"],
+        "muscle_group": ex["muscle_group"],
+        "muscle_label": ex["muscle_label"],
+        "movement_id": ex.get("movement_id") or movement_id_for(ex["name"]),
+        "completed": False,
+        "was_modified": False,
+        "original_name": ex["name"],
+        "completed_sets": [],
+    }
+
+
+# A draft older than this was abandoned: it is neither resumed nor allowed to block another day.
+DRAFT_MAX_AGE_HOURS = float(os.environ.get("DRAFT_MAX_AGE_HOURS", "12"))
+
+
+def draft_expired(draft: dict) -> bool:
+    started = datetime.fromisoformat(draft["started_at"])
+    return datetime.now(timezone.utc) - started > timedelta(hours=DRAFT_MAX_AGE_HOURS)
+
+
+@api_router.post("/workout-drafts")
+async def start_workout_draft(req: StartDraftRequest, user_id: str = Query(...)):
+    existing = await db.workout_drafts.find_one({"user_id": user_id}, {"_id": 0})
+    if existing and draft_expired(existing):
+        existing = None
+    if existing and existing["day_number"] == req.day_number and not req.replace:
+        return existing
+    if existing and not req.replace:
+        raise HTTPException(409, f"{existing['day_name']} is still in progress")
+    plan = await db.workout_plans.find_one({"user_id": user_id, "day_number": req.day_number}, {"_id": 0})
+    if not plan:
+        raise HTTPException(404, "Plan not found")
+    now = datetime.now(timezone.utc).isoformat()
+    draft = {
         "id": str(uuid.uuid4()),
         "user_id": user_id,
-        "day_number": session.day_number,
-        "day_name": session.day_name,
-        "completed_at": datetime.now(timezone.utc).isoformat(),
-        "duration_minutes": session.duration_minutes,
-        "exercises": [ex.model_dump() for ex in session.exercises],
-        "report": report
+        "day_number": plan["day_number"],
+        "day_name": plan["name"],
+        "started_at": now,
+        "updated_at": now,
+        "exercises": [draft_exercise(ex) for ex in plan["exercises"]],
     }
-    await db.workout_sessions.insert_one(session_doc)
-    session_doc.pop("_id", None)
-    return session_doc
+    await db.workout_drafts.replace_one({"user_id": user_id}, draft, upsert=True)
+    draft.pop("_id", None)
+    return draft
+
+
+@api_router.get("/workout-drafts/current")
+async def get_current_workout_draft(user_id: str = Query(...)):
+    draft = await db.workout_drafts.find_one({"user_id": user_id}, {"_id": 0})
+    if not draft or draft_expired(draft):
+        raise HTTPException(404, "No workout in progress")
+    return draft
+
+
+@api_router.patch("/workout-drafts/{draft_id}/exercises/{exercise_id}")
+async def patch_draft_exercise(draft_id: str, exercise_id: str, req: DraftExercisePatch, user_id: str = Query(...)):
+    changes = req.model_dump(exclude_none=True, exclude={"logged_set"})
+    update = {"$set": {"updated_at": datetime.now(timezone.utc).isoformat()}}
+    for field, value in changes.items():
+        update["$set"][f"exercises.$[ex].{field}"] = value
+    if req.name is not None:
+        update["$set"]["exercises.$[ex].movement_id"] = movement_id_for(req.name)
+    if req.logged_set is not None:
+        update["$push"] = {"exercises.$[ex].completed_sets": {
+            **req.logged_set.model_dump(), "at": datetime.now(timezone.utc).isoformat()
+        }}
+    result = await db.workout_drafts.update_one(
+        {"id": draft_id, "user_id": user_id, "exercises.exercise_id": exercise_id}, update,
+        array_filters=[{"ex.exercise_id": exercise_id}],
+    )
+    if result.matched_count == 0:
+        raise HTTPException(404, "Draft or exercise not found")
+    live_events.publish(user_id, "draft", {
+        "draft_id": draft_id, "exercise_id": exercise_id, **changes,
+        **({"logged_set": req.logged_set.model_dump()} if req.logged_set else {}),
+    })
+    return {"message": "Draft updated"}
+
+
+@api_router.post("/workout-drafts/{draft_id}/exercises")
+async def add_draft_exercise(draft_id: str, ex: SessionExercise, user_id: str = Query(...)):
+    exercise = {**ex.model_dump(), "completed_sets": []}
+    if not exercise["movement_id"]:
+        exercise["movement_id"] = movement_id_for(ex.name)
+    result = await db.workout_drafts.update_one(
+        {"id": draft_id, "user_id": user_id, "exercises.exercise_id": {"$ne": ex.exercise_id}},
+        {"$push": {"exercises": exercise}, "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}},
+    )
+    if result.matched_count == 0:
+        raise HTTPException(404, "Draft not found or exercise already present")
+    return exercise
+
+
+@api_router.delete("/workout-drafts/{draft_id}/exercises/{exercise_id}")
+async def remove_draft_exercise(draft_id: str, exercise_id: str, user_id: str = Query(...)):
+    result = await db.workout_drafts.update_one(
+        {"id": draft_id, "user_id": user_id, "exercises.exercise_id": exercise_id},
+        {"$pull": {"exercises": {"exercise_id": exercise_id}},
+         "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}},
+    )
+    if result.matched_count == 0:
+        raise HTTPException(404, "Draft or exercise not found")
+    return {"message": "Exercise removed"}
+
+
+@api_router.post("/workout-drafts/{draft_id}/finish")
+@idempotent("workout-drafts-finish")
+async def finish_workout_draft(
+    draft_id: str,
+    req: FinishDraftRequest = FinishDraftRequest(),
+    user_id: str = Query(...),
+    idempotency_key: Optional[str] = Header(None),
+):
+    # Deleting first claims the draft, so a retried finish cannot create two sessions;
+    # with an Idempotency-Key the retry also gets the stored session instead of a 404.
+    draft = await db.workout_drafts.find_one_and_delete({"id": draft_id, "user_id": user_id}, {"_id": 0})
+    if not draft:
+        raise HTTPException(404, "Draft not found")
+    duration = req.duration_minutes
+    if duration is None:
+        elapsed = datetime.now(timezone.utc) - datetime.fromisoformat(draft["started_at"])
+        duration = max(1, round(elapsed.total_seconds() / 60))
+    try:
+        return await store_workout_session(
+            user_id, draft["day_number"], draft["day_name"], duration, draft["exercises"], req.progress_loads,
+        )
+    except Exception:
+        await db.workout_drafts.insert_one(draft)
+        raise
+
+
+@api_router.delete("/workout-drafts/{draft_id}")
+async def discard_workout_draft(draft_id: str, user_id: str = Query(...)):
+    result = await db.workout_drafts.delete_one({"id": draft_id, "user_id": user_id})
+    if result.deleted_count == 0:
+        raise HTTPException(404, "Draft not found")
+    return {"message": "Draft discarded"}
 
 
 @api_router.get("/workout-sessions")
-async def get_workout_sessions(user_id: str = Query(...)):
-    return await db.workout_sessions.find({"user_id": user_id}, {"_id": 0}).sort("completed_at", -1).to_list(1000)
+@coalesced
+async def get_workout_sessions(user_id: str = Query(...), fields: Optional[str] = Query(None)):
+    projection = build_projection(fields, SESSION_FIELDS)
+    return await db.workout_sessions.find({"user_id": user_id}, projection).sort("completed_at", -1).to_list(1000)
+
+
+@api_router.get("/session-summaries")
+@coalesced
+async def get_session_summaries(
+    user_id: str = Query(...),
+    before: Optional[str] = Query(None, description="only sessions completed before this ISO timestamp"),
+    limit: int = Query(200, ge=1, le=1000),
+):
+    query = {"user_id": user_id}
+    if before:
+        query["completed_at"] = {"$lt": before}
+    return await db.session_summaries.find(query, SESSION_SUMMARY_PROJECTION).sort(
+        "completed_at", -1
+    ).limit(limit).to_list(limit)
 
 
 @api_router.get("/workout-sessions/{session_id}")
-async def get_workout_session(session_id: str, user_id: str = Query(...)):
-    session = await db.workout_sessions.find_one({"user_id": user_id, "id": session_id}, {"_id": 0})
+@coalesced
+async def get_workout_session(session_id: str, user_id: str = Query(...), fields: Optional[str] = Query(None)):
+    projection = build_projection(fields, SESSION_FIELDS)
+    session = await db.workout_sessions.find_one({"user_id": user_id, "id": session_id}, projection)
     if not session:
         raise HTTPException(404, "Session not found")
     return session
 
 
-@api_router.get("/next-workout")
-async def get_next_workout(user_id: str = Query(...)):
-    plans = await db.workout_plans.find({"user_id": user_id}, {"_id": 0}).sort("day_number", 1).to_list(10)
+RECENT_SESSION_PROJECTION = {
+    "_id": 0, "id": 1, "day_number": 1, "day_name": 1, "completed_at": 1,
+    "duration_minutes": 1, "report.total_volume": 1,
+}
+
+
+def last_sessions_pipeline(user_id: str) -> List[dict]:
+    # Sorted like the (user_id, day_number, completed_at desc) index, the $group of $first
+    # values runs as a DISTINCT_SCAN: one index seek per day instead of the whole history.
+    return [
+        {"$match": {"user_id": user_id}},
+        {"$sort": {"day_number": 1, "completed_at": -1}},
+        {"$group": {
+            "_id": "$day_number",
+            "completed_at": {"$first": "$completed_at"},
+            "duration_minutes": {"$first": "$duration_minutes"},
+        }},
+    ]
+
+
+async def fetch_last_sessions_by_day(user_id: str) -> List[dict]:
+    return await db.workout_sessions.aggregate(last_sessions_pipeline(user_id)).to_list(None)
+
+
+def compute_next_workout(plans: List[dict], last_by_day: List[dict]) -> dict:
     day_numbers = [p["day_number"] for p in plans]
-    last_sessions = {}
-    for day in day_numbers:
-        s = await db.workout_sessions.find_one(
-            {"user_id": user_id, "day_number": day}, {"_id": 0}, sort=[("completed_at", -1)]
-        )
-        if s:
-            last_sessions[str(day)] = {
-                "completed_at": s["completed_at"],
-                "duration_minutes": s.get("duration_minutes", 0)
-            }
-    last = await db.workout_sessions.find_one(
-        {"user_id": user_id}, {"_id": 0, "day_number": 1}, sort=[("completed_at", -1)]
-    )
+    last_sessions = {
+        str(s["_id"]): {"completed_at": s["completed_at"], "duration_minutes": s.get("duration_minutes", 0)}
+        for s in last_by_day if s["_id"] in day_numbers
+    }
+    last = max(last_by_day, key=lambda s: s["completed_at"], default=None)
     next_day = day_numbers[0] if day_numbers else 1
     if last and day_numbers:
         try:
-            current_idx = day_numbers.index(last["day_number"])
+            current_idx = day_numbers.index(last["_id"])
             next_day = day_numbers[(current_idx + 1) % len(day_numbers)]
         except ValueError:
             next_day = day_numbers[0]
     return {"next_day": next_day, "last_sessions": last_sessions, "total_days": len(day_numbers)}
 
 
+@api_router.get("/next-workout")
+@coalesced
+async def get_next_workout(user_id: str = Query(...)):
+    plans, last_by_day = await asyncio.gather(
+        db.workout_plans.find({"user_id": user_id}, {"_id": 0, "day_number": 1}).sort("day_number", 1).to_list(10),
+        fetch_last_sessions_by_day(user_id),
+    )
+    return compute_next_workout(plans, last_by_day)
+
+
+@api_router.get("/dashboard")
+@coalesced
+async def get_dashboard(user_id: str = Query(...), recent: int = Query(10, ge=1, le=50)):
+    plans, last_by_day, recent_sessions = await asyncio.gather(
+        db.workout_plans.find({"user_id": user_id}, {"_id": 0}).sort("day_number", 1).to_list(10),
+        fetch_last_sessions_by_day(user_id),
+        db.workout_sessions.find({"user_id": user_id}, RECENT_SESSION_PROJECTION)
+        .sort("completed_at", -1).limit(recent).to_list(recent),
+    )
+    return {
+        "plans": plans,
+        **compute_next_workout(plans, last_by_day),
+        "recent_sessions": recent_sessions,
+    }
+
+
+def iso_week(iso: str) -> str:
+    year, week, _ = datetime.fromisoformat(iso).isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+async def compute_user_analytics(user_id: str) -> dict:
+    weekly = {}
+    records = {}
+    totals = {"sessions": 0, "volume": 0.0, "minutes": 0}
+    last_completed_at = None
+    async for s in db.workout_sessions.find(
+        {"user_id": user_id},
+        {"_id": 0, "completed_at": 1, "duration_minutes": 1, "report.total_volume": 1,
+         "exercises.movement_id": 1, "exercises.name": 1, "exercises.load": 1, "exercises.completed": 1},
+    ).sort("completed_at", 1):
+        volume = s.get("report", {}).get("total_volume", 0)
+        week = weekly.setdefault(iso_week(s["completed_at"]), {"sessions": 0, "volume": 0.0})
+        week["sessions"] += 1
+        week["volume"] += volume
+        totals["sessions"] += 1
+        totals["volume"] += volume
+        totals["minutes"] += s.get("duration_minutes", 0)
+        last_completed_at = s["completed_at"]
+        for ex in s.get("exercises", []):
+            load = parse_load(ex.get("load"))
+            movement_id = ex.get("movement_id") or movement_id_for(ex.get("name", ""))
+            if ex.get("completed", True) and load > records.get(movement_id, {}).get("max_load", 0):
+                records[movement_id] = {
+                    "movement_id": movement_id,
+                    "name": ex.get("name", ""),
+                    "max_load": load,
+                    "achieved_at": s["completed_at"],
+                }
+    return {
+        "user_id": user_id,
+        "computed_at": datetime.now(timezone.utc).isoformat(),
+        "source_last_completed_at": last_completed_at,
+        "totals": totals,
+        "weekly_volume": [{"week": w, **v} for w, v in sorted(weekly.items())][-52:],
+        "personal_records": sorted(records.values(), key=lambda r: r["movement_id"]),
+    }
+
+
+async def refresh_user_analytics():
+    for user_id in await db.workout_sessions.distinct("user_id"):
+        latest, current = await asyncio.gather(
+            db.workout_sessions.find_one(
+                {"user_id": user_id}, {"_id": 0, "completed_at": 1}, sort=[("completed_at", -1)]
+            ),
+            db.user_analytics.find_one({"user_id": user_id}, {"_id": 0, "source_last_completed_at": 1}),
+        )
+        if current and latest and current.get("source_last_completed_at") == latest["completed_at"]:
+            continue
+        analytics = await compute_user_analytics(user_id)
+        await db.user_analytics.replace_one({"user_id": user_id}, analytics, upsert=True)
+        invalidate_user(user_id)
+
+
+scheduler.add_job(
+    "refresh_user_analytics", refresh_user_analytics,
+    interval=float(os.environ.get("ANALYTICS_REFRESH_SECONDS", "600")),
+)
+
+
+LOG_ARCHIVE_AFTER_DAYS = int(os.environ.get("LOG_ARCHIVE_AFTER_DAYS", "365"))
+LOG_ARCHIVE_BATCH = 5000
+
+
+def month_start(date: datetime) -> datetime:
+    return date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def build_rollup(user_id: str, exercise_id: str, month: datetime, docs: List[dict], names: dict) -> dict:
+    loads = [parse_load(doc.get("l")) for doc in docs]
+    last = docs[-1]
+    return {
+        "user_id": user_id,
+        "exercise_id": exercise_id,
+        "movement_id": last["m"],
+        "exercise_name": names.get(last["n"], ""),
+        "day_number": last.get("dn", 0),
+        "month": month.strftime("%Y-%m"),
+        "count": len(docs),
+        "max_load": max(loads),
+        "mean_load": round(sum(loads) / len(loads), 2),
+        "last_load": last.get("l", ""),
+        "last_date": last["d"],
+        "total_volume": sum(doc.get("s", 0) * doc.get("r", 0) * load for doc, load in zip(docs, loads)),
+    }
+
+
+async def rebuild_rollups(user_id: str, since_by_exercise: dict):
+    """Recompute the monthly rollups of one user's archived logs from each exercise's given month on."""
+    groups = {}
+    async for doc in db.exercise_logs_archive.find({
+        "u": user_id, "e": {"$in": list(since_by_exercise)}, "d": {"$gte": min(since_by_exercise.values())},
+    }).sort("d", 1):
+        if doc["d"] >= since_by_exercise[doc["e"]]:
+            groups.setdefault((doc["e"], month_start(doc["d"])), []).append(doc)
+    names = await exercise_names.resolve(doc["n"] for docs in groups.values() for doc in docs)
+    await db.exercise_log_rollups.bulk_write([
+        ReplaceOne(
+            {"user_id": user_id, "exercise_id": exercise_id, "month": month.strftime("%Y-%m")},
+            build_rollup(user_id, exercise_id, month, docs, names),
+            upsert=True,
+        )
+        for (exercise_id, month), docs in groups.items()
+    ], ordered=False)
+
+
+async def archive_old_logs():
+    """Move raw logs older than LOG_ARCHIVE_AFTER_DAYS to exercise_logs_archive and roll them up by month.
+
+    The horizon is rounded down to a month boundary, so a month is either all raw
+    or all rolled up. Rows are copied before they are deleted; a run interrupted in
+    between is finished by the next one. Every user whose logs moved gets a `reset`
+    tombstone, so delta-sync clients reload instead of keeping the archived rows.
+    """
+    cutoff = month_start(datetime.now(timezone.utc) - timedelta(days=LOG_ARCHIVE_AFTER_DAYS))
+    touched = {}
+    while True:
+        docs = await exercise_logs.find({"d": {"$lt": cutoff}}).limit(LOG_ARCHIVE_BATCH).to_list(None)
+        if not docs:
+            break
+        try:
+            await db.exercise_logs_archive.insert_many(docs, ordered=False)
+        except BulkWriteError as exc:
+            if any(error["code"] != 11000 for error in exc.details["writeErrors"]):
+                raise
+        await exercise_logs.delete_many({"_id": {"$in": [doc["_id"] for doc in docs]}})
+        for doc in docs:
+            since = touched.setdefault(doc["u"], {})
+            since[doc["e"]] = min(since.get(doc["e"], doc["d"]), month_start(doc["d"]))
+
+    for user_id, since_by_exercise in touched.items():
+        await rebuild_rollups(user_id, since_by_exercise)
+        await record_tombstone(user_id, "reset")
+        invalidate_user(user_id)
+
+
+scheduler.add_job(
+    "archive_old_logs", archive_old_logs,
+    interval=float(os.environ.get("LOG_ARCHIVE_INTERVAL_SECONDS", "86400")),
+)
+
+
+@api_router.get("/analytics")
+@coalesced
+async def get_analytics(user_id: str = Query(...)):
+    analytics = await db.user_analytics.find_one({"user_id": user_id}, {"_id": 0})
+    if not analytics:
+        raise HTTPException(404, "Analytics not computed yet")
+    return analytics
+
+
+EXPORT_CHUNK_ROWS = int(os.environ.get("EXPORT_CHUNK_ROWS", "50000"))
+# Column -> pandas dtype; "timestamp" columns hold ISO strings and are parsed as UTC.
+EXPORT_COLUMNS = {
+    "sessions": {
+        "session_id": "string", "completed_at": "timestamp", "day_number": "Int32", "day_name": "string",
+        "duration_minutes": "Int32", "exercise_id": "string", "movement_id": "string", "name": "string",
+        "muscle_group": "string", "sets": "Int32", "reps": "Int32", "load": "string", "load_kg": "float64",
+        "completed": "boolean", "was_modified": "boolean",
+    },
+    "logs": {
+        "id": "string", "date": "timestamp", "day_number": "Int32", "exercise_id": "string",
+        "movement_id": "string", "exercise_name": "string", "sets": "Int32", "reps": "Int32",
+        "load": "string", "load_kg": "float64",
+    },
+}
+EXPORT_FORMATS = {
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+    "arrow": (".arrow", "application/vnd.apache.arrow.file"),
+}
+
+
+def export_schema(dataset: str):
+    types = {
+        "string": pa.string(), "Int32": pa.int32(), "float64": pa.float64(),
+        "boolean": pa.bool_(), "timestamp": pa.timestamp("us", tz="UTC"),
+    }
+    return pa.schema([(column, types[dtype]) for column, dtype in EXPORT_COLUMNS[dataset].items()])
+
+
+def export_chunk_table(dataset: str, rows: List[dict], schema):
+    frame = pd.DataFrame(rows, columns=list(EXPORT_COLUMNS[dataset]))
+    for column, dtype in EXPORT_COLUMNS[dataset].items():
+        if dtype == "timestamp":
+            frame[column] = pd.to_datetime(frame[column], utc=True, format="ISO8601")
+        else:
+            frame[column] = frame[column].astype(dtype)
+    return pa.Table.from_pandas(frame, schema=schema, preserve_index=False)
+
+
+async def export_rows(dataset: str, user_id: str):
+    """Yield flat rows in chunks of at most EXPORT_CHUNK_ROWS, oldest first."""
+    chunk = []
+    if dataset == "sessions":
+        async for s in db.workout_sessions.find(
+            {"user_id": user_id}, {"_id": 0, "report": 0}
+        ).sort("completed_at", 1):
+            for ex in s.get("exercises", []):
+                chunk.append({
+                    "session_id": s["id"], "completed_at": s["completed_at"], "day_number": s["day_number"],
+                    "day_name": s["day_name"], "duration_minutes": s["duration_minutes"],
+                    "exercise_id": ex["exercise_id"], "movement_id": ex.get("movement_id"), "name": ex["name"],
+                    "muscle_group": ex.get("muscle_group"), "sets": ex["sets"], "reps": ex["reps"],
+                    "load": ex["load"], "load_kg": parse_load(ex["load"]),
+                    "completed": ex.get("completed"), "was_modified": ex.get("was_modified"),
+                })
+            if len(chunk) >= EXPORT_CHUNK_ROWS:
+                yield chunk
+                chunk = []
+    else:
+        await log_buffer.flush()
+        # Archived rows are all older than the live ones, so the output stays in date order.
+        for collection in (db.exercise_logs_archive, exercise_logs):
+            async for doc in collection.find({"u": user_id}).sort("d", 1):
+                chunk.append(doc)
+                if len(chunk) >= EXPORT_CHUNK_ROWS:
+                    yield await decode_export_logs(chunk)
+                    chunk = []
+        chunk = await decode_export_logs(chunk)
+    if chunk:
+        yield chunk
+
+
+async def decode_export_logs(docs: List[dict]) -> List[dict]:
+    names = await exercise_names.resolve(doc["n"] for doc in docs)
+    return [{**log, "load_kg": parse_load(log["load"])} for log in (decode_log(doc, names) for doc in docs)]
+
+
+def open_export_writer(fmt: str, path: str, schema):
+    if fmt == "parquet":
+        return pq.ParquetWriter(path, schema, compression="zstd")
+    return pa.ipc.new_file(path, schema)
+
+
+@api_router.get("/export/{dataset}")
+async def export_history(
+    dataset: str,
+    user_id: str = Query(...),
+    fmt: str = Query("parquet", alias="format"),
+):
+    """Columnar dump of a user's sessions (one row per exercise) or logs.
+
+    Each chunk becomes one Parquet row group / Arrow record batch, so memory stays
+    bounded by EXPORT_CHUNK_ROWS whatever the history length.
+    """
+    if dataset not in EXPORT_COLUMNS:
+        raise HTTPException(404, "Unknown dataset")
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(400, f"Unknown format: {fmt}")
+    if pa is None:
+        raise HTTPException(501, "Columnar export needs pandas and pyarrow installed")
+
+    suffix, media_type = EXPORT_FORMATS[fmt]
+    schema = export_schema(dataset)
+    fd, path = tempfile.mkstemp(prefix="export-", suffix=suffix)
+    os.close(fd)
+    try:
+        writer = await asyncio.to_thread(open_export_writer, fmt, path, schema)
+        try:
+            async for rows in export_rows(dataset, user_id):
+                table = await asyncio.to_thread(export_chunk_table, dataset, rows, schema)
+                await asyncio.to_thread(writer.write_table, table)
+        finally:
+            await asyncio.to_thread(writer.close)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return FileResponse(
+        path, media_type=media_type, filename=f"{user_id}-{dataset}{suffix}",
+        background=BackgroundTask(os.unlink, path),
+    )
+
+
+SNAPSHOT_FORMAT = "workout-snapshot"
+SNAPSHOT_VERSION = 1
+# Collection -> field holding the owner. Summaries and catalog entries are rebuilt on restore.
+SNAPSHOT_COLLECTIONS = {
+    "workout_plans": "user_id",
+    "workout_sessions": "user_id",
+    "exercise_logs": "u",
+    "exercise_logs_archive": "u",
+    "exercise_log_rollups": "user_id",
+}
+# Collections in compact log form, whose name codes are swapped for names in the archive.
+SNAPSHOT_LOG_COLLECTIONS = ("exercise_logs", "exercise_logs_archive")
+SNAPSHOT_INSERT_BATCH = 1000
+
+
+def snapshot_collection(name: str):
+    # Snapshots name the live logs "exercise_logs" whichever storage mode wrote them.
+    return exercise_logs if name == "exercise_logs" else db[name]
+
+
+async def snapshot_records(user_id: str):
+    await log_buffer.flush()
+    yield {
+        "format": SNAPSHOT_FORMAT,
+        "version": SNAPSHOT_VERSION,
+        "user_id": user_id,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+    for collection, owner in SNAPSHOT_COLLECTIONS.items():
+        async for doc in snapshot_collection(collection).find({owner: user_id}):
+            if collection in SNAPSHOT_LOG_COLLECTIONS:
+                # Name codes are local to this database; ship the name itself.
+                doc["n"] = (await exercise_names.resolve([doc["n"]])).get(doc["n"], "")
+            yield {"c": collection, "d": doc}
+
+
+@api_router.get("/snapshot")
+async def download_snapshot(user_id: str = Query(...)):
+    """Gzipped NDJSON of a user's plans, sessions and logs: a header line, then one line per document."""
+    async def body():
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        async for record in snapshot_records(user_id):
+            chunk = compressor.compress(json_util.dumps(record).encode() + b"\n")
+            if chunk:
+                yield chunk
+        yield compressor.flush()
+
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    return StreamingResponse(body(), media_type="application/gzip", headers={
+        "Content-Disposition": f'attachment; filename="{user_id}-{stamp}.ndjson.gz"',
+    })
+
+
+def read_snapshot(fileobj, user_id: str) -> tuple:
+    """Parse and validate a whole archive before anything is deleted."""
+    docs = {collection: [] for collection in SNAPSHOT_COLLECTIONS}
+    try:
+        with gzip.GzipFile(fileobj=fileobj, mode="rb") as archive:
+            lines = iter(archive)
+            header = json_util.loads(next(lines))
+            if header.get("format") != SNAPSHOT_FORMAT or header.get("version") != SNAPSHOT_VERSION:
+                raise HTTPException(400, "Unsupported snapshot format or version")
+            if header.get("user_id") != user_id:
+                raise HTTPException(400, f"Snapshot belongs to {header.get('user_id')}")
+            for line in lines:
+                record = json_util.loads(line)
+                collection, doc = record["c"], record["d"]
+                if collection not in docs or doc.get(SNAPSHOT_COLLECTIONS[collection]) != user_id:
+                    raise HTTPException(400, "Snapshot contains foreign documents")
+                docs[collection].append(doc)
+    except (OSError, EOFError, StopIteration, ValueError, KeyError, TypeError) as exc:
+        raise HTTPException(400, f"Invalid snapshot: {exc!r}")
+    return header, docs
+
+
+@api_router.post("/snapshot")
+async def restore_snapshot(user_id: str = Query(...), file: UploadFile = File(...)):
+    """Replace a user's plans, sessions and logs with the contents of a snapshot."""
+    header, docs = await asyncio.to_thread(read_snapshot, file.file, user_id)
+    for collection in SNAPSHOT_LOG_COLLECTIONS:
+        for log in docs[collection]:
+            log["n"] = await exercise_names.code(log["n"])
+
+    # Logs buffered before the restore must not land on top of it.
+    await log_buffer.flush()
+    await asyncio.gather(
+        *(snapshot_collection(collection).delete_many({owner: user_id})
+          for collection, owner in SNAPSHOT_COLLECTIONS.items()),
+        db.session_summaries.delete_many({"user_id": user_id}),
+        db.exercise_catalog.delete_many({"user_id": user_id}),
+    )
+    batches = [
+        (collection, collection_docs[i:i + SNAPSHOT_INSERT_BATCH])
+        for collection, collection_docs in docs.items()
+        for i in range(0, len(collection_docs), SNAPSHOT_INSERT_BATCH)
+    ]
+    summaries = [session_summary(s) for s in docs["workout_sessions"]]
+    batches += [
+        ("session_summaries", summaries[i:i + SNAPSHOT_INSERT_BATCH])
+        for i in range(0, len(summaries), SNAPSHOT_INSERT_BATCH)
+    ]
+    for collection, batch in batches:
+        await snapshot_collection(collection).insert_many(batch, ordered=False)
+    for plan in docs["workout_plans"]:
+        await upsert_catalog_entries(user_id, plan["day_number"], plan["exercises"])
+    # Restored documents keep their old seq values; make synced clients start over.
+    await record_tombstone(user_id, "reset")
+    invalidate_user(user_id)
+    return {
+        "message": "Snapshot restored",
+        "created_at": header.get("created_at"),
+        "restored": {collection: len(collection_docs) for collection, collection_docs in docs.items()},
+    }
+
+
+SYNC_MAX_CHANGES = int(os.environ.get("SYNC_MAX_CHANGES", "1000"))
+
+
+@api_router.get("/sync")
+async def sync_changes(user_id: str = Query(...), since: int = Query(0, ge=0)):
+    """Plans, sessions and logs written after change `since`, plus tombstones for deletions.
+
+    Clients keep the returned `seq` and pass it as `since` next time. With
+    `full_resync` set the lists are empty and the client should reload through the
+    regular endpoints: on first sync, after a snapshot restore or a log archive run,
+    for a `since` the server never issued, or when more than SYNC_MAX_CHANGES of one
+    kind piled up.
+    """
+    # Read the counter first and stop short of any reservation still being written:
+    # everything numbered above the returned seq is sent next time, never skipped.
+    seq = settled_change_seq(await db.change_counters.find_one({"_id": user_id}))
+    result = {"seq": seq, "full_resync": False, "plans": [], "sessions": [], "logs": [], "deleted": []}
+    if since == 0 or since > seq:
+        return {**result, "full_resync": True}
+    if since >= seq:
+        return result
+
+    window = {"$gt": since, "$lte": seq}
+    plans, sessions, logs, deleted = await asyncio.gather(
+        db.workout_plans.find({"user_id": user_id, "seq": window}, {"_id": 0}).to_list(SYNC_MAX_CHANGES + 1),
+        db.workout_sessions.find({"user_id": user_id, "seq": window}, {"_id": 0}).to_list(SYNC_MAX_CHANGES + 1),
+        exercise_logs.find({"u": user_id, "q": window}).to_list(SYNC_MAX_CHANGES + 1),
+        db.tombstones.find({"user_id": user_id, "seq": window}, {"_id": 0, "user_id": 0}).sort(
+            "seq", 1
+        ).to_list(SYNC_MAX_CHANGES + 1),
+    )
+    if any(len(changes) > SYNC_MAX_CHANGES for changes in (plans, sessions, logs, deleted)) or any(
+        t["kind"] == "reset" for t in deleted
+    ):
+        return {**result, "full_resync": True}
+    names = await exercise_names.resolve(doc["n"] for doc in logs)
+    return {
+        **result,
+        "plans": plans,
+        "sessions": sessions,
+        "logs": [decode_log(doc, names) for doc in logs],
+        "deleted": deleted,
+    }
+
+
+LIVE_HEARTBEAT_SECONDS = float(os.environ.get("LIVE_HEARTBEAT_SECONDS", "15"))
+
+
+@api_router.get("/live")
+async def live_stream(user_id: str = Query(...)):
+    """Server-Sent Events for one user: `log`, `load`, `draft`, `session` and `resync`."""
+    queue = live_events.subscribe(user_id)
+    if queue is None:
+        raise HTTPException(429, "Too many live streams for this user")
+
+    async def events():
+        seq = 0
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), LIVE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing an idle connection.
+                    yield ": heartbeat\n\n"
+                    continue
+                seq += 1
+                payload = json.dumps({**message["data"], "at": message["at"]})
+                yield f"id: {seq}\nevent: {message['event']}\ndata: {payload}\n\n"
+        finally:
+            live_events.unsubscribe(user_id, queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+
+@api_router.get("/admin/metrics")
+async def get_metrics():
+    return {
+        "admission": admission.snapshot(),
+        "read_coalescing": {"leaders": read_flight.leaders, "followers": read_flight.followers},
+        "scheduler": scheduler.snapshot(),
+        "cache": {**user_cache.snapshot(), "invalidation_bus": invalidation_bus.status},
+        "live_events": live_events.snapshot(),
+        "log_buffer": log_buffer.snapshot(),
+    }
+
+
 @api_router.post("/seed")
 async def seed_database():
-    await db.app_meta.delete_one({"key": "workout_plan_version"})
-    await sync_andrea_workout_plans()
+    await sync_plan_templates(force=True)
     return {"message": "Workout plans updated", "users": len(PROFILES), "days_per_user": len(SEED_DATA)}
 
 
-ensure_frontend_build()
+if os.environ.get("SKIP_FRONTEND_BUILD") != "1":
+    ensure_frontend_build()
 
 app.include_router(api_router)
 
 if (FRONTEND_BUILD_DIR / "static").exists():
     app.mount("/static", StaticFiles(directory=FRONTEND_BUILD_DIR / "static"), name="static")
 
+app.add_middleware(
+    ProfilingMiddleware,
+    admin_token=os.environ.get("PROFILE_ADMIN_TOKEN", ""),
+    sample_rate=float(os.environ.get("PROFILE_SAMPLE_RATE", "0")),
+    output_dir=Path(os.environ.get("PROFILE_DIR", str(ROOT_DIR / "profiles"))),
+    max_bytes=int(os.environ.get("PROFILE_MAX_BYTES", "262144")),
+)
+app.add_middleware(AdmissionControlMiddleware, controller=admission)
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Idempotent-Replayed"],
 )
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -520,13 +3239,34 @@ logger = logging.getLogger(__name__)
 
 @app.on_event("startup")
 async def startup():
-    updated = await sync_andrea_workout_plans()
-    if updated:
-        logger.info("Workout plans synced for Andrea")
+    await ensure_indexes()
+    await exercise_names.load()
+    if await backfill_movement_catalog():
+        logger.info("Movement catalog backfilled")
+    if await compact_exercise_logs():
+        logger.info("Exercise logs migrated to the compact schema")
+    moved = await migrate_log_storage()
+    if moved:
+        logger.info("Moved %d exercise logs to %s", moved, exercise_logs.name)
+    if await backfill_session_summaries():
+        logger.info("Session summaries backfilled")
+    written = await sync_plan_templates()
+    if written:
+        logger.info("Plan templates synced: %d days rewritten", written)
+    replayed = await log_buffer.start()
+    if replayed:
+        logger.info("Replayed %d buffered exercise logs from %s", replayed, LOG_JOURNAL_DIR)
+    if os.environ.get("BACKGROUND_JOBS_ENABLED", "1") == "1":
+        scheduler.start()
+    if os.environ.get("CACHE_ENABLED", "1") == "1":
+        invalidation_bus.start()
 
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await invalidation_bus.stop()
+    await scheduler.stop()
+    await log_buffer.stop()
     client.close()
 
 
@@ -0,0 +1,173 @@
+"""
+Admission control (per-user token buckets and the concurrency cap), run in-process.
+
+The middleware wraps a stub ASGI app whose requests can be held open, so the
+queue paths are exercised without a database or real load.
+"""
+import asyncio
+import os
+import sys
+import time
+import types
+from pathlib import Path
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+# server reads these at import; same values as test_query_budgets so either may import it first.
+os.environ["DB_NAME"] = os.environ.get("QUERY_BUDGET_DB_NAME", "workout_query_budget")
+os.environ["BACKGROUND_JOBS_ENABLED"] = "0"
+os.environ["CACHE_ENABLED"] = "0"
+os.environ["SKIP_FRONTEND_BUILD"] = "1"
+# The client never connects here; keep MONGO_URL unset afterwards so the budget tests still skip.
+had_mongo_url = "MONGO_URL" in os.environ
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import server  # noqa: E402
+
+if not had_mongo_url:
+    del os.environ["MONGO_URL"]
+
+
+def controller(rate=10.0, burst=100.0, max_concurrent=4, max_queue=4, queue_timeout=1.0):
+    return server.AdmissionController(rate, burst, max_concurrent, max_queue, queue_timeout)
+
+
+class HeldApp:
+    """ASGI app answering 200; requests to /api/hold wait until `release` is set."""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.entered = 0
+
+    async def __call__(self, scope, receive, send):
+        self.entered += 1
+        if scope["path"] == "/api/hold":
+            await self.release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+
+async def wait_until(predicate, timeout=1.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "condition not reached"
+        await asyncio.sleep(0.005)
+
+
+def run(ctl, scenario):
+    async def main():
+        app = HeldApp()
+        transport = httpx.ASGITransport(app=server.AdmissionControlMiddleware(app, ctl))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await scenario(client, app)
+    return asyncio.run(main())
+
+
+class TestTokenBucket:
+    """Token buckets refill at `rate` up to `burst`"""
+
+    def test_burst_then_wait(self, monkeypatch):
+        clock = [1000.0]
+        monkeypatch.setattr(server, "time", types.SimpleNamespace(monotonic=lambda: clock[0]))
+        ctl = controller(rate=2.0, burst=3.0)
+        assert [ctl.take_token("a") for _ in range(3)] == [0, 0, 0]
+        assert ctl.take_token("a") == pytest.approx(0.5)
+        # Other users have their own bucket.
+        assert ctl.take_token("b") == 0
+
+        clock[0] += 0.25
+        assert ctl.take_token("a") == pytest.approx(0.25)
+        clock[0] += 0.25
+        assert ctl.take_token("a") == 0
+
+    def test_refill_is_capped_at_burst(self, monkeypatch):
+        clock = [1000.0]
+        monkeypatch.setattr(server, "time", types.SimpleNamespace(monotonic=lambda: clock[0]))
+        ctl = controller(rate=1.0, burst=2.0)
+        ctl.take_token("a")
+        clock[0] += 3600
+        assert [ctl.take_token("a") for _ in range(3)][:2] == [0, 0]
+        assert ctl.take_token("a") > 0
+
+
+class TestAdmissionMiddleware:
+    """Rejections are 429s with a Retry-After header"""
+
+    def test_rate_limited_request_gets_retry_after(self):
+        ctl = controller(rate=0.5, burst=1.0)
+
+        async def scenario(client, app):
+            first = await client.get("/api/plans?user_id=a")
+            second = await client.get("/api/plans?user_id=a")
+            other = await client.get("/api/plans?user_id=b")
+            return first, second, other
+
+        first, second, other = run(ctl, scenario)
+        assert first.status_code == 200 and other.status_code == 200
+        assert second.status_code == 429
+        assert second.json() == {"detail": "Rate limit exceeded"}
+        assert second.headers["Retry-After"] == "2"
+        assert ctl.counters["rate_limited"] == 1
+
+    def test_non_api_paths_bypass_admission(self):
+        ctl = controller(rate=0.1, burst=1.0)
+
+        async def scenario(client, app):
+            return [(await client.get("/index.html")).status_code for _ in range(3)]
+
+        assert run(ctl, scenario) == [200, 200, 200]
+        assert ctl.counters["admitted"] == 0
+
+    def test_queue_full_is_rejected(self):
+        ctl = controller(max_concurrent=1, max_queue=0, queue_timeout=3.0)
+
+        async def scenario(client, app):
+            held = asyncio.create_task(client.get("/api/hold?user_id=a"))
+            await wait_until(lambda: ctl.in_flight == 1)
+            rejected = await client.get("/api/plans?user_id=b")
+            app.release.set()
+            return await held, rejected
+
+        held, rejected = run(ctl, scenario)
+        assert held.status_code == 200
+        assert rejected.status_code == 429
+        assert rejected.json() == {"detail": "Server busy"}
+        assert rejected.headers["Retry-After"] == "3"
+        assert ctl.counters["queue_full"] == 1
+
+    def test_queued_request_times_out(self):
+        ctl = controller(max_concurrent=1, max_queue=1, queue_timeout=0.05)
+
+        async def scenario(client, app):
+            held = asyncio.create_task(client.get("/api/hold?user_id=a"))
+            await wait_until(lambda: ctl.in_flight == 1)
+            timed_out = await client.get("/api/plans?user_id=b")
+            app.release.set()
+            return await held, timed_out
+
+        held, timed_out = run(ctl, scenario)
+        assert held.status_code == 200
+        assert timed_out.status_code == 429
+        assert timed_out.headers["Retry-After"] == "1"
+        assert ctl.counters["queue_timeout"] == 1
+        assert ctl.waiting == 0 and ctl.in_flight == 0
+
+    def test_queued_request_runs_when_a_slot_frees(self):
+        ctl = controller(max_concurrent=1, max_queue=1, queue_timeout=2.0)
+
+        async def scenario(client, app):
+            held = asyncio.create_task(client.get("/api/hold?user_id=a"))
+            await wait_until(lambda: ctl.in_flight == 1)
+            queued = asyncio.create_task(client.get("/api/plans?user_id=b"))
+            await wait_until(lambda: ctl.waiting == 1)
+            app.release.set()
+            return await held, await queued
+
+        held, queued = run(ctl, scenario)
+        assert held.status_code == queued.status_code == 200
+        assert ctl.counters["admitted"] == 2
+        assert ctl.counters["peak_waiting"] == 1
+        assert ctl.in_flight == 0
@@ -301,6 +301,108 @@ class TestExercisesCRUD:
         print("✅ Update exercise load works")
 
 
+class TestPlanVersions:
+    """Test optimistic concurrency on plan edits"""
+    
+    def test_stale_if_match_conflicts(self):
+        """An edit based on an old ETag fails with 409"""
+        response = requests.get(f"{BASE_URL}/api/workout-plans/1?user_id=andrea")
+        assert response.status_code == 200
+        etag = response.headers["ETag"]
+        exercise = response.json()["exercises"][0]
+        
+        first = requests.put(
+            f"{BASE_URL}/api/workout-plans/1/exercises/{exercise['id']}?user_id=andrea",
+            json={"sets": exercise["sets"]}, headers={"If-Match": etag}
+        )
+        assert first.status_code == 200
+        assert first.headers["ETag"] != etag
+        
+        stale = requests.put(
+            f"{BASE_URL}/api/workout-plans/1/exercises/{exercise['id']}?user_id=andrea",
+            json={"sets": exercise["sets"]}, headers={"If-Match": etag}
+        )
+        assert stale.status_code == 409
+        assert stale.headers["ETag"] == first.headers["ETag"]
+        print("✅ Stale If-Match rejected with 409")
+    
+    def test_if_none_match_not_modified(self):
+        """GET with the current ETag returns 304"""
+        etag = requests.get(f"{BASE_URL}/api/workout-plans/1?user_id=andrea").headers["ETag"]
+        response = requests.get(f"{BASE_URL}/api/workout-plans/1?user_id=andrea", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        print("✅ Unchanged plan returns 304")
+
+    def test_load_change_returns_new_etag(self):
+        """PUT .../load hands back the moved ETag; an unknown exercise leaves the plan alone"""
+        response = requests.get(f"{BASE_URL}/api/workout-plans/1?user_id=andrea")
+        exercise, etag = response.json()["exercises"][1], response.headers["ETag"]
+
+        missing = requests.put(
+            f"{BASE_URL}/api/workout-plans/1/exercises/missing/load?user_id=andrea", json={"load": "1"}
+        )
+        assert missing.status_code == 404
+        assert requests.get(f"{BASE_URL}/api/workout-plans/1?user_id=andrea").headers["ETag"] == etag
+
+        response = requests.put(
+            f"{BASE_URL}/api/workout-plans/1/exercises/{exercise['id']}/load?user_id=andrea",
+            json={"load": exercise["current_load"]}
+        )
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+        edit = requests.put(
+            f"{BASE_URL}/api/workout-plans/1/exercises/{exercise['id']}?user_id=andrea",
+            json={"sets": exercise["sets"]}, headers={"If-Match": response.headers["ETag"]}
+        )
+        assert edit.status_code == 200
+        print("✅ Load change returns the ETag for the next edit")
+
+    def test_bulk_edit_applies_all_or_nothing(self):
+        """PATCH /api/workout-plans/{day}/exercises applies a batch in one versioned write"""
+        response = requests.get(f"{BASE_URL}/api/workout-plans/2?user_id=andrea")
+        plan, etag = response.json(), response.headers["ETag"]
+        first, second = plan["exercises"][0], plan["exercises"][1]
+        
+        invalid = requests.patch(
+            f"{BASE_URL}/api/workout-plans/2/exercises?user_id=andrea",
+            json={"operations": [
+                {"op": "update", "exercise_id": first["id"], "changes": {"sets": first["sets"] + 1}},
+                {"op": "delete", "exercise_id": "missing"},
+            ]},
+            headers={"If-Match": etag},
+        )
+        assert invalid.status_code == 404
+        unchanged = requests.get(f"{BASE_URL}/api/workout-plans/2?user_id=andrea")
+        assert unchanged.headers["ETag"] == etag
+        
+        response = requests.patch(
+            f"{BASE_URL}/api/workout-plans/2/exercises?user_id=andrea",
+            json={"operations": [
+                {"op": "move", "exercise_id": second["id"], "position": 0},
+                {"op": "update", "exercise_id": first["id"], "changes": {"sets": first["sets"]}},
+                {"op": "insert", "position": 1, "exercise": {"name": "TEST_Bulk Face Pull"}},
+            ]},
+            headers={"If-Match": etag},
+        )
+        assert response.status_code == 200
+        body = response.json()
+        assert body["version"] == plan["version"] + 1
+        assert response.headers["ETag"] == f'"{body["version"]}"'
+        ids = [ex["id"] for ex in body["exercises"]]
+        assert ids[0] == second["id"] and ids[2] == first["id"]
+        assert body["exercises"][1]["name"] == "TEST_Bulk Face Pull"
+        
+        # Restore the original order
+        requests.patch(
+            f"{BASE_URL}/api/workout-plans/2/exercises?user_id=andrea",
+            json={"operations": [
+                {"op": "delete", "exercise_id": ids[1]},
+                {"op": "move", "exercise_id": first["id"], "position": 0},
+            ]},
+        )
+        print("✅ Bulk plan edit applied atomically")
+
+
 class TestExerciseLogs:
     """Test exercise logging endpoints"""
     
@@ -335,6 +437,57 @@ class TestExerciseLogs:
         logs = response.json()
         assert isinstance(logs, list)
         print(f"✅ Get exercise logs returns {len(logs)} logs")
+    
+    def test_exercise_logs_keep_api_shape(self):
+        """Compactly stored logs are returned with the long field names"""
+        logs = requests.get(f"{BASE_URL}/api/exercise-logs/andrea-d1-ex0?user_id=andrea").json()
+        if not logs:
+            pytest.skip("No logs available")
+        for log in logs:
+            assert {"user_id", "exercise_id", "exercise_name", "load", "date"} <= set(log)
+            assert log.get("rollup") or "id" in log
+            assert not {"u", "e", "n", "d"} & set(log)
+        assert [log["date"] for log in logs] == sorted(log["date"] for log in logs)
+        print("✅ Exercise logs keep the API shape")
+
+    def test_idempotency_key_replays_log(self):
+        """A retried POST with the same Idempotency-Key returns the first log instead of a new one"""
+        payload = {"exercise_id": "andrea-d2-ex0", "exercise_name": "Stacco rumeno", "load": "42",
+                   "sets": 3, "reps": 8, "day_number": 0}
+        headers = {"Idempotency-Key": f"TEST_{uuid.uuid4()}"}
+        first = requests.post(f"{BASE_URL}/api/exercise-logs?user_id=andrea", json=payload, headers=headers)
+        retry = requests.post(f"{BASE_URL}/api/exercise-logs?user_id=andrea", json=payload, headers=headers)
+        assert first.status_code == retry.status_code == 200
+        assert retry.json() == first.json()
+        assert retry.headers.get("Idempotent-Replayed") == "true"
+        
+        changed = requests.post(f"{BASE_URL}/api/exercise-logs?user_id=andrea",
+                                json={**payload, "load": "43"}, headers=headers)
+        assert changed.status_code == 422
+        print("✅ Idempotency-Key replays the stored log")
+
+    def test_new_log_is_read_back_immediately(self):
+        """A log is returned by the next read, even while it waits in the write-behind buffer"""
+        payload = {"exercise_id": "andrea-d2-ex0", "exercise_name": "Stacco rumeno", "load": "41",
+                   "sets": 3, "reps": 8, "day_number": 0}
+        created = requests.post(f"{BASE_URL}/api/exercise-logs?user_id=andrea", json=payload).json()
+        logs = requests.get(f"{BASE_URL}/api/exercise-logs/andrea-d2-ex0?user_id=andrea&fields=id,load").json()
+        assert {"id": created["id"], "load": "41"} in logs
+        print("✅ New log is read back immediately")
+
+    def test_archived_months_come_back_as_rollups(self):
+        """Monthly rollups of archived logs precede the raw logs"""
+        logs = requests.get(f"{BASE_URL}/api/exercise-logs/andrea-d1-ex0?user_id=andrea").json()
+        rollups = [log for log in logs if log.get("rollup")]
+        if not rollups:
+            pytest.skip("No archived logs for andrea-d1-ex0")
+        assert logs[:len(rollups)] == rollups
+        for rollup in rollups:
+            assert rollup["count"] >= 1
+            assert rollup["max_load"] >= rollup["mean_load"]
+            assert rollup["load"] == rollup["last_load"]
+            assert rollup["date"][:7] == rollup["month"]
+        print(f"✅ {len(rollups)} monthly rollups precede the raw logs")
 
 
 class TestWorkoutSessions:
@@ -418,6 +571,56 @@ class TestWorkoutSessions:
         session = response.json()
         assert session["id"] == session_id
         print("✅ Get individual session works")
+    
+    def test_session_summaries_match_sessions(self):
+        """GET /api/session-summaries returns one flat row per session, newest first"""
+        sessions = requests.get(f"{BASE_URL}/api/workout-sessions?user_id=andrea").json()
+        response = requests.get(f"{BASE_URL}/api/session-summaries?user_id=andrea")
+        assert response.status_code == 200
+        summaries = response.json()
+        
+        assert [s["id"] for s in summaries] == [s["id"] for s in sessions][:len(summaries)]
+        for summary, session in zip(summaries, sessions):
+            assert "exercises" not in summary
+            assert summary["total_volume"] == session["report"]["total_volume"]
+            assert summary["load_change_count"] == len(session["report"]["load_changes"])
+        print(f"✅ {len(summaries)} session summaries match sessions")
+    
+    def test_session_progresses_loads_at_top_of_range(self):
+        """Logging every set at the top of its range moves the plan load up one step"""
+        plan = requests.get(f"{BASE_URL}/api/workout-plans/3?user_id=andrea").json()
+        ex = next((e for e in plan["exercises"] if e.get("rep_range") and e["current_load"].isdigit() and int(e["current_load"]) > 0), None)
+        if ex is None:
+            pytest.skip("No loaded exercise with a rep range on day 3")
+        high = int(ex["rep_range"].split("/")[1])
+        session = {
+            "day_number": 3, "day_name": plan["name"], "duration_minutes": 40,
+            "exercises": [{
+                "exercise_id": ex["id"], "name": ex["name"], "sets": ex["sets"], "reps": ex["reps"],
+                "rep_range": ex["rep_range"], "load": ex["current_load"],
+                "muscle_group": ex["muscle_group"], "muscle_label": ex["muscle_label"], "completed": True,
+            }],
+        }
+        # The planned reps are a target, not a result: without logged sets nothing moves.
+        unlogged = requests.post(f"{BASE_URL}/api/workout-sessions?user_id=andrea", json=session).json()
+        assert unlogged["progression"] == []
+        
+        session["exercises"][0]["completed_sets"] = [{"reps": high, "load": ex["current_load"]}] * ex["sets"]
+        skipped = requests.post(f"{BASE_URL}/api/workout-sessions?user_id=andrea",
+                                json={**session, "progress_loads": False}).json()
+        assert skipped["progression"] == []
+        
+        result = requests.post(f"{BASE_URL}/api/workout-sessions?user_id=andrea", json=session).json()
+        assert [c["exercise_id"] for c in result["progression"]] == [ex["id"]]
+        new_load = result["progression"][0]["new_load"]
+        assert float(new_load) > float(ex["current_load"])
+        updated = requests.get(f"{BASE_URL}/api/workout-plans/3?user_id=andrea").json()
+        assert next(e for e in updated["exercises"] if e["id"] == ex["id"])["current_load"] == new_load
+        
+        # Restore the original load
+        requests.put(f"{BASE_URL}/api/workout-plans/3/exercises/{ex['id']}/load?user_id=andrea",
+                     json={"load": ex["current_load"]})
+        print(f"✅ {ex['name']} progressed {ex['current_load']} -> {new_load}")
 
 
 class TestNextWorkout:
@@ -434,6 +637,255 @@ class TestNextWorkout:
         assert "total_days" in data
         assert data["next_day"] in [1, 2, 3, 4]
         print(f"✅ Next workout for Andrea: Day {data['next_day']}")
+    
+    def test_get_dashboard_for_user(self):
+        """GET /api/dashboard returns plans, next day and recent sessions in one payload"""
+        response = requests.get(f"{BASE_URL}/api/dashboard?user_id=andrea&recent=5")
+        assert response.status_code == 200
+        data = response.json()
+        
+        next_workout = requests.get(f"{BASE_URL}/api/next-workout?user_id=andrea").json()
+        assert data["next_day"] == next_workout["next_day"]
+        assert data["total_days"] == len(data["plans"])
+        assert len(data["recent_sessions"]) <= 5
+        for s in data["recent_sessions"]:
+            assert "exercises" not in s
+            assert "completed_at" in s
+        print(f"✅ Dashboard for Andrea: {len(data['plans'])} plans, {len(data['recent_sessions'])} recent sessions")
+
+
+class TestMovementCatalog:
+    """Test cross-day movement catalog and progress queries"""
+    
+    def test_movements_group_exercise_ids_across_days(self):
+        """GET /api/movements maps Day 1 and Day 3 Lat machine to one movement"""
+        response = requests.get(f"{BASE_URL}/api/movements?user_id=andrea")
+        assert response.status_code == 200
+        movements = {m["movement_id"]: m for m in response.json()}
+        
+        assert "lat-machine" in movements
+        assert set(movements["lat-machine"]["exercise_ids"]) >= {"andrea-d1-ex1", "andrea-d3-ex1"}
+        print("✅ Lat machine maps to a single movement across days")
+    
+    def test_exercise_logs_across_days(self):
+        """Logs written on Day 1 and Day 3 are returned together by movement"""
+        for day, ex_id in [(1, "andrea-d1-ex1"), (3, "andrea-d3-ex1")]:
+            requests.post(
+                f"{BASE_URL}/api/exercise-logs?user_id=andrea",
+                json={"exercise_id": ex_id, "exercise_name": "Lat machine", "load": "40", "day_number": day}
+            )
+        
+        response = requests.get(f"{BASE_URL}/api/movements/lat-machine/logs?user_id=andrea")
+        assert response.status_code == 200
+        logs = response.json()
+        assert {"andrea-d1-ex1", "andrea-d3-ex1"} <= {log["exercise_id"] for log in logs}
+        
+        response = requests.get(f"{BASE_URL}/api/exercise-logs/andrea-d1-ex1?user_id=andrea&across_days=true")
+        assert response.status_code == 200
+        assert len(response.json()) == len(logs)
+        print(f"✅ {len(logs)} Lat machine logs returned across days")
+
+
+class TestWorkoutDrafts:
+    """Test server-side in-progress workout drafts"""
+    
+    def test_draft_patch_and_finish(self):
+        """Draft is resumable, patched per exercise and promoted to a session"""
+        existing = requests.get(f"{BASE_URL}/api/workout-drafts/current?user_id=romi")
+        if existing.status_code == 200:
+            requests.delete(f"{BASE_URL}/api/workout-drafts/{existing.json()['id']}?user_id=romi")
+        
+        response = requests.post(f"{BASE_URL}/api/workout-drafts?user_id=romi", json={"day_number": 1})
+        assert response.status_code == 200
+        draft = response.json()
+        ex_id = draft["exercises"][0]["exercise_id"]
+        
+        resumed = requests.post(f"{BASE_URL}/api/workout-drafts?user_id=romi", json={"day_number": 1}).json()
+        assert resumed["id"] == draft["id"]
+        
+        response = requests.patch(
+            f"{BASE_URL}/api/workout-drafts/{draft['id']}/exercises/{ex_id}?user_id=romi",
+            json={"completed": True, "logged_set": {"reps": 10, "load": "20"}}
+        )
+        assert response.status_code == 200
+        current = requests.get(f"{BASE_URL}/api/workout-drafts/current?user_id=romi").json()
+        assert current["exercises"][0]["completed"] is True
+        assert len(current["exercises"][0]["completed_sets"]) == 1
+        
+        response = requests.post(
+            f"{BASE_URL}/api/workout-drafts/{draft['id']}/finish?user_id=romi", json={"duration_minutes": 30}
+        )
+        assert response.status_code == 200
+        session = response.json()
+        assert session["report"]["completed_exercises"] == 1
+        
+        assert requests.get(f"{BASE_URL}/api/workout-drafts/current?user_id=romi").status_code == 404
+        print("✅ Draft patched and promoted to a workout session")
+
+    def test_retried_finish_replays_the_session(self):
+        """A finish retried with the same Idempotency-Key returns the stored session, not 404"""
+        existing = requests.get(f"{BASE_URL}/api/workout-drafts/current?user_id=romi")
+        if existing.status_code == 200:
+            requests.delete(f"{BASE_URL}/api/workout-drafts/{existing.json()['id']}?user_id=romi")
+
+        draft = requests.post(f"{BASE_URL}/api/workout-drafts?user_id=romi", json={"day_number": 1}).json()
+        url = f"{BASE_URL}/api/workout-drafts/{draft['id']}/finish?user_id=romi"
+        headers = {"Idempotency-Key": f"TEST_{uuid.uuid4()}"}
+        first = requests.post(url, json={"duration_minutes": 30}, headers=headers)
+        retry = requests.post(url, json={"duration_minutes": 30}, headers=headers)
+        assert first.status_code == retry.status_code == 200
+        assert retry.json()["id"] == first.json()["id"]
+        assert retry.headers.get("Idempotent-Replayed") == "true"
+        print("✅ Retried draft finish replays the stored session")
+
+    def test_draft_for_other_day_conflicts_until_replaced(self):
+        """Starting another day names the open draft; replace=true discards it"""
+        existing = requests.get(f"{BASE_URL}/api/workout-drafts/current?user_id=romi")
+        if existing.status_code == 200:
+            requests.delete(f"{BASE_URL}/api/workout-drafts/{existing.json()['id']}?user_id=romi")
+
+        first = requests.post(f"{BASE_URL}/api/workout-drafts?user_id=romi", json={"day_number": 1}).json()
+        response = requests.post(f"{BASE_URL}/api/workout-drafts?user_id=romi", json={"day_number": 2})
+        assert response.status_code == 409
+        assert first["day_name"] in response.json()["detail"]
+
+        response = requests.post(
+            f"{BASE_URL}/api/workout-drafts?user_id=romi", json={"day_number": 2, "replace": True}
+        )
+        assert response.status_code == 200
+        assert response.json()["day_number"] == 2
+        requests.delete(f"{BASE_URL}/api/workout-drafts/{response.json()['id']}?user_id=romi")
+        print("✅ Conflicting draft reported and replaced")
+
+
+class TestSparseFieldsets:
+    """Test fields= projections on GET endpoints"""
+    
+    def test_plans_with_fields_omit_exercises(self):
+        """GET /api/workout-plans?fields=id,day_number returns only those keys"""
+        response = requests.get(f"{BASE_URL}/api/workout-plans?user_id=andrea&fields=id,day_number")
+        assert response.status_code == 200
+        for plan in response.json():
+            assert set(plan.keys()) <= {"id", "day_number"}
+        print("✅ Plans honour fields= projection")
+    
+    def test_sessions_with_nested_field(self):
+        """GET /api/workout-sessions?fields=... supports dotted paths"""
+        response = requests.get(
+            f"{BASE_URL}/api/workout-sessions?user_id=andrea&fields=id,day_name,completed_at,report.total_volume"
+        )
+        assert response.status_code == 200
+        for s in response.json():
+            assert "exercises" not in s
+            assert set(s.get("report", {}).keys()) <= {"total_volume"}
+        print("✅ Sessions honour nested fields= projection")
+    
+    def test_unknown_field_rejected(self):
+        """Unknown or malformed fields return 400"""
+        response = requests.get(f"{BASE_URL}/api/workout-sessions?user_id=andrea&fields=id,$where")
+        assert response.status_code == 400
+        print("✅ Unknown field rejected with 400")
+
+
+class TestColumnarExport:
+    """Test Parquet/Arrow export of training history"""
+    
+    def test_export_sessions_parquet(self):
+        """GET /api/export/sessions returns a Parquet file"""
+        response = requests.get(f"{BASE_URL}/api/export/sessions?user_id=andrea")
+        if response.status_code == 501:
+            pytest.skip("pyarrow not installed on the server")
+        assert response.status_code == 200
+        assert response.content[:4] == b"PAR1"
+        print(f"✅ Sessions export is {len(response.content)} bytes of Parquet")
+    
+    def test_export_logs_arrow(self):
+        """GET /api/export/logs?format=arrow returns an Arrow IPC file"""
+        response = requests.get(f"{BASE_URL}/api/export/logs?user_id=andrea&format=arrow")
+        if response.status_code == 501:
+            pytest.skip("pyarrow not installed on the server")
+        assert response.status_code == 200
+        assert response.content[:6] == b"ARROW1"
+        print("✅ Logs export is an Arrow file")
+    
+    def test_unknown_dataset(self):
+        """Unknown datasets return 404"""
+        response = requests.get(f"{BASE_URL}/api/export/plans?user_id=andrea")
+        assert response.status_code == 404
+        print("✅ Unknown export dataset rejected")
+
+
+class TestSnapshots:
+    """Test per-user snapshot and restore"""
+    
+    def test_snapshot_round_trip(self):
+        """GET /api/snapshot output restores to the same plans"""
+        plans = requests.get(f"{BASE_URL}/api/workout-plans?user_id=andrea").json()
+        response = requests.get(f"{BASE_URL}/api/snapshot?user_id=andrea")
+        assert response.status_code == 200
+        assert response.content[:2] == b"\x1f\x8b"
+        
+        restored = requests.post(
+            f"{BASE_URL}/api/snapshot?user_id=andrea",
+            files={"file": ("andrea.ndjson.gz", response.content, "application/gzip")}
+        )
+        assert restored.status_code == 200
+        assert restored.json()["restored"]["workout_plans"] == len(plans)
+        assert requests.get(f"{BASE_URL}/api/workout-plans?user_id=andrea").json() == plans
+        print(f"✅ Snapshot round trip restored {restored.json()['restored']}")
+    
+    def test_restore_rejects_other_users_snapshot(self):
+        """A snapshot can only be restored into the user it was taken from"""
+        snapshot = requests.get(f"{BASE_URL}/api/snapshot?user_id=andrea").content
+        response = requests.post(
+            f"{BASE_URL}/api/snapshot?user_id=someone-else",
+            files={"file": ("andrea.ndjson.gz", snapshot, "application/gzip")}
+        )
+        assert response.status_code == 400
+        print("✅ Foreign snapshot rejected")
+
+
+class TestLiveEvents:
+    """Test the Server-Sent Events stream"""
+    
+    def test_live_stream_opens(self):
+        """GET /api/live streams text/event-stream"""
+        with requests.get(f"{BASE_URL}/api/live?user_id=andrea", stream=True, timeout=10) as response:
+            assert response.status_code == 200
+            assert response.headers["content-type"].startswith("text/event-stream")
+            assert next(response.iter_lines()) == b"retry: 3000"
+        print("✅ Live stream opens")
+
+
+class TestDeltaSync:
+    """Test /api/sync change feed"""
+    
+    def test_first_sync_requests_full_resync(self):
+        """since=0 asks the client to reload everything"""
+        response = requests.get(f"{BASE_URL}/api/sync?user_id=andrea&since=0")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["full_resync"] is True
+        assert isinstance(data["seq"], int)
+        print(f"✅ First sync returns seq {data['seq']}")
+    
+    def test_sync_returns_new_log_and_deleted_day(self):
+        """Changes after `since` include new logs and tombstones"""
+        since = requests.get(f"{BASE_URL}/api/sync?user_id=andrea&since=0").json()["seq"]
+        log = requests.post(f"{BASE_URL}/api/exercise-logs?user_id=andrea", json={
+            "exercise_id": "andrea-d1-ex0", "exercise_name": "Panca piana man",
+            "load": "18", "sets": 4, "reps": 4, "day_number": 0,
+        }).json()
+        day = requests.post(f"{BASE_URL}/api/workout-plans?user_id=andrea", json={})
+        if day.status_code == 200:
+            requests.delete(f"{BASE_URL}/api/workout-plans/{day.json()['day_number']}?user_id=andrea")
+        
+        data = requests.get(f"{BASE_URL}/api/sync?user_id=andrea&since={since}").json()
+        assert data["full_resync"] is False
+        assert log["id"] in [l["id"] for l in data["logs"]]
+        if day.status_code == 200:
+            assert day.json()["id"] in [t["id"] for t in data["deleted"] if t["kind"] == "plan"]
+        print(f"✅ Sync since {since} returned {len(data['logs'])} logs, {len(data['deleted'])} deletions")
 
 
 class TestSeedEndpoint:
@@ -0,0 +1,371 @@
+"""
+Query-count and latency budgets for the API, run in-process.
+
+Requests go straight to the ASGI app; a pymongo command listener counts the
+Mongo commands each request issues, so N+1 patterns fail here instead of in
+production. Needs a reachable MongoDB at MONGO_URL; data goes to a separate
+database (QUERY_BUDGET_DB_NAME, default workout_query_budget).
+"""
+import asyncio
+import copy
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+if not os.environ.get("MONGO_URL"):
+    pytest.skip("MONGO_URL environment variable not set", allow_module_level=True)
+
+os.environ["DB_NAME"] = os.environ.get("QUERY_BUDGET_DB_NAME", "workout_query_budget")
+os.environ["BACKGROUND_JOBS_ENABLED"] = "0"
+os.environ["CACHE_ENABLED"] = "0"
+os.environ["SKIP_FRONTEND_BUILD"] = "1"
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import server  # noqa: E402
+
+USER = "budget-athlete"
+LATENCY_BUDGET_MS = float(os.environ.get("LATENCY_BUDGET_MS", "500"))
+IGNORED_COMMANDS = {"endSessions", "hello", "isMaster", "ismaster", "ping", "saslStart", "saslContinue"}
+
+
+@pytest.fixture(scope="module")
+def loop():
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(server.client.admin.command("ping"))
+    except Exception as exc:
+        loop.close()
+        pytest.skip(f"MongoDB not reachable: {exc}")
+    loop.run_until_complete(server.client.drop_database(os.environ["DB_NAME"]))
+    loop.run_until_complete(server.startup())
+    for day_data in server.SEED_DATA:
+        plan = server.build_seed_plan(USER, day_data)
+        loop.run_until_complete(server.db.workout_plans.insert_one(plan))
+        loop.run_until_complete(server.upsert_catalog_entries(USER, plan["day_number"], plan["exercises"]))
+    yield loop
+    loop.run_until_complete(server.client.drop_database(os.environ["DB_NAME"]))
+    loop.close()
+
+
+def call(loop, method, path, **kwargs):
+    """Run one request in-process; return the response, the Mongo commands it issued and its latency."""
+    async def run():
+        trace = server.CommandTrace()
+        token = server.command_trace.set(trace)
+        try:
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                t0 = time.perf_counter()
+                response = await client.request(method, path, **kwargs)
+                elapsed_ms = (time.perf_counter() - t0) * 1000
+        finally:
+            server.command_trace.reset(token)
+        commands = [c for c in trace.commands if c["command"] not in IGNORED_COMMANDS]
+        return response, commands, elapsed_ms
+    return loop.run_until_complete(run())
+
+
+def traced(loop, coro):
+    """Run a coroutine in-process; return its result and the Mongo commands it issued."""
+    async def run():
+        trace = server.CommandTrace()
+        token = server.command_trace.set(trace)
+        try:
+            result = await coro
+        finally:
+            server.command_trace.reset(token)
+        return result, [c for c in trace.commands if c["command"] not in IGNORED_COMMANDS]
+    return loop.run_until_complete(run())
+
+
+def assert_budget(result, max_commands, max_ms=LATENCY_BUDGET_MS):
+    response, commands, elapsed_ms = result
+    assert response.status_code == 200, response.text
+    issued = [f"{c['command']} {c['collection']}" for c in commands]
+    assert len(commands) <= max_commands, f"{len(commands)} commands > budget {max_commands}: {issued}"
+    assert elapsed_ms <= max_ms, f"{elapsed_ms:.0f}ms > budget {max_ms:.0f}ms"
+
+
+def session_payload(loop, day_number):
+    plan = loop.run_until_complete(server.db.workout_plans.find_one({"user_id": USER, "day_number": day_number}))
+    return {
+        "day_number": day_number,
+        "day_name": plan["name"],
+        "duration_minutes": 60,
+        "exercises": [
+            {
+                "exercise_id": ex["id"],
+                "name": ex["name"],
+                "sets": ex["sets"],
+                "reps": ex["reps"],
+                "rep_range": ex.get("rep_range", ""),
+                "load": ex["current_load"],
+                "muscle_group": ex["muscle_group"],
+                "muscle_label": ex["muscle_label"],
+            }
+            for ex in plan["exercises"]
+        ],
+    }
+
+
+class TestReadBudgets:
+    """Reads stay within a fixed number of Mongo commands"""
+
+    def test_workout_plans(self, loop):
+        assert_budget(call(loop, "GET", f"/api/workout-plans?user_id={USER}"), 1)
+
+    def test_next_workout(self, loop):
+        for day in (1, 2, 3):
+            call(loop, "POST", f"/api/workout-sessions?user_id={USER}", json=session_payload(loop, day))
+        assert_budget(call(loop, "GET", f"/api/next-workout?user_id={USER}"), 2)
+
+    def test_last_session_per_day_is_a_distinct_scan(self, loop):
+        # One index seek per day, however long the history: no collection scan, no in-memory sort.
+        try:
+            plan = str(loop.run_until_complete(server.db.command({
+                "aggregate": "workout_sessions", "pipeline": server.last_sessions_pipeline(USER), "explain": True,
+            })))
+        except (NotImplementedError, server.OperationFailure) as exc:
+            pytest.skip(f"server cannot explain aggregations: {exc}")
+        assert "DISTINCT_SCAN" in plan
+        assert "COLLSCAN" not in plan and "'SORT'" not in plan
+
+    def test_dashboard(self, loop):
+        assert_budget(call(loop, "GET", f"/api/dashboard?user_id={USER}"), 3)
+
+    def test_workout_sessions(self, loop):
+        assert_budget(call(loop, "GET", f"/api/workout-sessions?user_id={USER}"), 1)
+
+    def test_sync(self, loop):
+        assert_budget(call(loop, "GET", f"/api/sync?user_id={USER}&since=1"), 5)
+
+    def test_session_summaries(self, loop):
+        assert_budget(call(loop, "GET", f"/api/session-summaries?user_id={USER}"), 1)
+
+    def test_exercise_logs_across_days(self, loop):
+        assert_budget(call(loop, "GET", f"/api/exercise-logs/{USER}-d1-ex1?user_id={USER}&across_days=true"), 3)
+
+
+class TestWriteBudgets:
+    """Writes stay within a fixed number of Mongo commands"""
+
+    def test_create_exercise_log(self, loop):
+        # change seq, plan load update, log insert, change seq release
+        payload = {"exercise_id": f"{USER}-d1-ex0", "exercise_name": "Panca piana manubri", "load": "18",
+                   "sets": 3, "reps": 10, "day_number": 1}
+        assert_budget(call(loop, "POST", f"/api/exercise-logs?user_id={USER}", json=payload), 4)
+
+    def test_replayed_exercise_log(self, loop):
+        # claim attempt, stored response; nothing the handler would do
+        payload = {"exercise_id": f"{USER}-d1-ex0", "exercise_name": "Panca piana manubri", "load": "19",
+                   "sets": 3, "reps": 10, "day_number": 1}
+        headers = {"Idempotency-Key": "budget-retry"}
+        call(loop, "POST", f"/api/exercise-logs?user_id={USER}", json=payload, headers=headers)
+        assert_budget(call(loop, "POST", f"/api/exercise-logs?user_id={USER}", json=payload, headers=headers), 2)
+
+    def test_update_exercise_load(self, loop):
+        assert_budget(call(loop, "PUT", f"/api/workout-plans/1/exercises/{USER}-d1-ex0/load?user_id={USER}",
+                           json={"load": "20"}), 4)
+
+    def test_edit_plan_exercises(self, loop):
+        # plan read, change seq, conditional update, change seq release, catalog upsert;
+        # the inserted name already has a code
+        operations = [
+            {"op": "move", "exercise_id": f"{USER}-d2-ex1", "position": 0},
+            {"op": "update", "exercise_id": f"{USER}-d2-ex0", "changes": {"sets": 5}},
+            {"op": "insert", "exercise": {"name": "Panca piana manubri"}},
+        ]
+        assert_budget(call(loop, "PATCH", f"/api/workout-plans/2/exercises?user_id={USER}",
+                           json={"operations": operations}), 5)
+
+    def test_create_workout_session(self, loop):
+        # change seq, catalog lookup, previous session, session + summary inserts, commitTransaction,
+        # change seq release; no sets are logged, so no load progresses
+        assert_budget(call(loop, "POST", f"/api/workout-sessions?user_id={USER}", json=session_payload(loop, 1)), 7)
+
+    def test_create_workout_session_with_progression(self, loop):
+        # as above, plus one plan update and one log insert for all the loads that progressed
+        payload = session_payload(loop, 2)
+        for ex in payload["exercises"]:
+            top = ex["rep_range"].split("/")[-1] if ex["rep_range"] else "0"
+            ex["completed_sets"] = [{"reps": int(top), "load": ex["load"]}] * ex["sets"]
+        response, commands, elapsed_ms = call(loop, "POST", f"/api/workout-sessions?user_id={USER}", json=payload)
+        assert response.json()["progression"]
+        assert_budget((response, commands, elapsed_ms), 9)
+
+
+class TestLoadProgression:
+    """Which loads progress after a session, and to what"""
+
+    def test_decimal_load_keeps_its_decimal(self):
+        ex = {
+            "exercise_id": "x", "name": "Curl", "completed": True, "sets": 2, "reps": 10, "rep_range": "6/10",
+            "load": "22.5 kg", "completed_sets": [{"reps": 10, "load": "22.5 kg"}] * 2,
+        }
+        assert [c["new_load"] for c in server.plan_progressions([ex])] == ["24.5 kg"]
+
+    def test_planned_reps_alone_do_not_progress(self):
+        ex = {
+            "exercise_id": "x", "name": "Curl", "completed": True, "sets": 2, "reps": 10, "rep_range": "6/10",
+            "load": "22.5", "completed_sets": [{"reps": 10, "load": "22.5"}],
+        }
+        assert server.plan_progressions([ex]) == []
+
+
+class TestSyncCursor:
+    """/api/sync never moves a client past a change number that is reserved but not yet written"""
+
+    def sync(self, loop, since):
+        response, _, _ = call(loop, "GET", f"/api/sync?user_id={USER}&since={since}")
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    def test_open_reservation_holds_the_cursor(self, loop):
+        since = self.sync(loop, 1)["seq"]
+        reserved = loop.run_until_complete(server.next_change_seq(USER))
+        payload = {"exercise_id": f"{USER}-d3-ex0", "exercise_name": "Squat", "load": "60",
+                   "sets": 3, "reps": 8, "day_number": 0}
+        call(loop, "POST", f"/api/exercise-logs?user_id={USER}", json=payload)
+
+        held = self.sync(loop, since)
+        assert held["seq"] == reserved - 1 == since
+        assert held["logs"] == []
+
+        loop.run_until_complete(server.release_change_seq(USER, reserved))
+        released = self.sync(loop, since)
+        assert released["seq"] > reserved
+        assert [log["load"] for log in released["logs"]] == ["60"]
+
+
+class TestPlanTemplateSync:
+    """Startup template sync only touches plan days whose template changed"""
+
+    def plan_versions(self, loop):
+        profile_ids = [p["id"] for p in server.PROFILES]
+        plans = loop.run_until_complete(server.db.workout_plans.find(
+            {"user_id": {"$in": profile_ids}}, {"_id": 0, "user_id": 1, "day_number": 1, "version": 1}
+        ).to_list(None))
+        return {(p["user_id"], p["day_number"]): p.get("version") for p in plans}
+
+    def test_unchanged_fingerprint_reads_no_plans(self, loop):
+        loop.run_until_complete(server.sync_plan_templates())
+        written, commands = traced(loop, server.sync_plan_templates())
+        assert written == 0
+        assert [(c["command"], c["collection"]) for c in commands] == [("find", "app_meta")]
+
+    def test_legacy_plans_are_adopted_not_rewritten(self, loop):
+        loop.run_until_complete(server.sync_plan_templates())
+        profile_id = server.PROFILES[0]["id"]
+        before = self.plan_versions(loop)
+        loop.run_until_complete(server.db.workout_plans.update_many(
+            {"user_id": profile_id}, {"$unset": {"template_hash": ""}}
+        ))
+        loop.run_until_complete(server.db.workout_plans.update_one(
+            {"user_id": profile_id, "day_number": 1}, {"$set": {"exercises.0.current_load": "99"}}
+        ))
+        loop.run_until_complete(server.db.app_meta.delete_one({"key": "plan_template_fingerprint"}))
+        loop.run_until_complete(server.db.app_meta.insert_one(
+            {"key": "workout_plan_version", "value": server.LEGACY_WORKOUT_PLAN_VERSION}
+        ))
+
+        assert loop.run_until_complete(server.sync_plan_templates()) == 0
+        assert self.plan_versions(loop) == before
+        plan = loop.run_until_complete(server.db.workout_plans.find_one({"user_id": profile_id, "day_number": 1}))
+        assert plan["exercises"][0]["current_load"] == "99"
+        assert plan["template_hash"] == server.plan_template_hash(server.SEED_DATA[0])
+        assert loop.run_until_complete(server.db.app_meta.find_one({"key": "workout_plan_version"})) is None
+
+    def test_changed_day_is_rewritten_in_one_bulk_write(self, loop, monkeypatch):
+        loop.run_until_complete(server.sync_plan_templates())
+        before = self.plan_versions(loop)
+        seed = copy.deepcopy(server.SEED_DATA)
+        seed[1]["exercises"][0]["sets"] += 1
+        monkeypatch.setattr(server, "SEED_DATA", seed)
+
+        written, commands = traced(loop, server.sync_plan_templates())
+        profile_ids = [p["id"] for p in server.PROFILES]
+        assert written == len(profile_ids)
+        plan_writes = [c for c in commands if c["collection"] == "workout_plans" and c["command"] != "find"]
+        assert len(plan_writes) == len(profile_ids)
+
+        after = self.plan_versions(loop)
+        changed_day = seed[1]["day_number"]
+        for key, version in before.items():
+            assert after[key] == (version + 1 if key[1] == changed_day else version), key
+        plan = loop.run_until_complete(
+            server.db.workout_plans.find_one({"user_id": profile_ids[0], "day_number": changed_day})
+        )
+        assert plan["exercises"][0]["sets"] == seed[1]["exercises"][0]["sets"]
+
+
+class TestLogArchive:
+    """Archiving a user's old logs sends their sync clients back to a full reload"""
+
+    def test_archive_run_forces_full_resync(self, loop):
+        since = call(loop, "GET", f"/api/sync?user_id={USER}&since=1")[0].json()["seq"]
+        old = datetime.now(timezone.utc) - timedelta(days=server.LOG_ARCHIVE_AFTER_DAYS + 62)
+        code = loop.run_until_complete(server.exercise_names.code("Panca piana manubri"))
+        loop.run_until_complete(server.exercise_logs.insert_many([server.encode_log({
+            "user_id": USER, "exercise_id": f"{USER}-d1-ex0", "movement_id": "panca-piana-manubri",
+            "exercise_name": "Panca piana manubri", "load": "12", "sets": 3, "reps": 10,
+            "date": old, "day_number": 1,
+        }, code)]))
+        loop.run_until_complete(server.archive_old_logs())
+
+        response, _, _ = call(loop, "GET", f"/api/sync?user_id={USER}&since={since}")
+        assert response.json()["full_resync"] is True
+
+    def test_archive_batches_are_served_by_an_index(self, loop):
+        indexes = loop.run_until_complete(server.exercise_logs.collection.index_information())
+        assert any(index["key"][0][0] == "d" for index in indexes.values())
+
+
+class TestLogWriteBuffer:
+    """Buffered logs are replayed from every abandoned journal and never skipped by sync"""
+
+    @pytest.fixture
+    def buffer(self, loop, tmp_path, monkeypatch):
+        monkeypatch.setattr(server, "LOG_JOURNAL_DIR", tmp_path)
+        monkeypatch.setattr(server, "LOG_BUFFER_FLUSH_SECONDS", 3600)
+        buffer = server.LogWriteBuffer(True)
+        monkeypatch.setattr(server, "log_buffer", buffer)
+        yield buffer
+        loop.run_until_complete(buffer.stop())
+
+    def test_start_replays_unheld_slots(self, loop, buffer, tmp_path):
+        code = loop.run_until_complete(server.exercise_names.code("Panca piana manubri"))
+        for slot, load in ((0, "31"), (3, "33")):
+            doc = server.encode_log({
+                "user_id": USER, "exercise_id": f"{USER}-d1-ex0", "movement_id": "panca-piana-manubri",
+                "exercise_name": "Panca piana manubri", "load": load, "sets": 3, "reps": 10,
+                "date": datetime.now(timezone.utc), "day_number": 1,
+            }, code)
+            (tmp_path / f"log-buffer-{slot}.ndjson").write_bytes(
+                server.json_util.dumps({**doc, "_id": server.ObjectId()}).encode() + b"\n"
+            )
+        assert loop.run_until_complete(buffer.start()) == 2
+        assert (tmp_path / "log-buffer-3.ndjson").read_bytes() == b""
+        stored = loop.run_until_complete(
+            server.exercise_logs.find({"u": USER, "l": {"$in": ["31", "33"]}}).to_list(None)
+        )
+        assert len(stored) == 2
+
+    def test_sync_waits_for_the_flush(self, loop, buffer):
+        loop.run_until_complete(buffer.start())
+        since = call(loop, "GET", f"/api/sync?user_id={USER}&since=1")[0].json()["seq"]
+        payload = {"exercise_id": f"{USER}-d1-ex0", "exercise_name": "Panca piana manubri", "load": "35",
+                   "sets": 3, "reps": 10, "day_number": 0}
+        call(loop, "POST", f"/api/exercise-logs?user_id={USER}", json=payload)
+
+        held = call(loop, "GET", f"/api/sync?user_id={USER}&since={since}")[0].json()
+        assert held["seq"] == since and held["logs"] == []
+
+        loop.run_until_complete(buffer.flush())
+        flushed = call(loop, "GET", f"/api/sync?user_id={USER}&since={since}")[0].json()
+        assert [log["load"] for log in flushed["logs"]] == ["35"]
@@ -0,0 +1,101 @@
+"""
+Read coalescing and the per-user read cache, run in-process.
+
+The coalesced function is a stub whose reads can be held open, so the
+ordering between a read, a write and a second read is exercised without a database.
+"""
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# server reads these at import; same values as test_query_budgets so either may import it first.
+os.environ["DB_NAME"] = os.environ.get("QUERY_BUDGET_DB_NAME", "workout_query_budget")
+os.environ["BACKGROUND_JOBS_ENABLED"] = "0"
+os.environ["CACHE_ENABLED"] = "0"
+os.environ["SKIP_FRONTEND_BUILD"] = "1"
+# The client never connects here; keep MONGO_URL unset afterwards so the budget tests still skip.
+had_mongo_url = "MONGO_URL" in os.environ
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import server  # noqa: E402
+
+if not had_mongo_url:
+    del os.environ["MONGO_URL"]
+
+
+class HeldRead:
+    """A coalesced read returning the current `value`; each call waits until `release` is set."""
+
+    def __init__(self):
+        self.value = "before"
+        self.calls = 0
+        self.release = asyncio.Event()
+
+        @server.coalesced
+        async def read_plan(user_id: str):
+            self.calls += 1
+            value = self.value
+            await self.release.wait()
+            return value
+
+        self.read = read_plan
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = server.UserCache(ttl=60)
+    monkeypatch.setattr(server, "user_cache", cache)
+    monkeypatch.setattr(server, "read_flight", server.SingleFlight())
+    return cache
+
+
+class TestReadCoalescing:
+    """Concurrent identical reads share one query, but never across a write"""
+
+    def test_concurrent_reads_share_one_call(self, cache):
+        async def scenario():
+            held = HeldRead()
+            first = asyncio.create_task(held.read(user_id="a"))
+            second = asyncio.create_task(held.read(user_id="a"))
+            await asyncio.sleep(0)
+            held.release.set()
+            return await first, await second, held.calls
+
+        assert asyncio.run(scenario()) == ("before", "before", 1)
+
+    def test_read_after_write_does_not_join_earlier_read(self, cache):
+        async def scenario():
+            held = HeldRead()
+            first = asyncio.create_task(held.read(user_id="a"))
+            while held.calls == 0:
+                await asyncio.sleep(0)
+            held.value = "after"
+            server.invalidate_user("a")
+            second = asyncio.create_task(held.read(user_id="a"))
+            await asyncio.sleep(0)
+            held.release.set()
+            return await first, await second, held.calls
+
+        assert asyncio.run(scenario()) == ("before", "after", 2)
+
+    def test_cache_never_keeps_a_read_from_before_a_write(self, cache):
+        cache.enabled = True
+
+        async def scenario():
+            held = HeldRead()
+            first = asyncio.create_task(held.read(user_id="a"))
+            while held.calls == 0:
+                await asyncio.sleep(0)
+            held.value = "after"
+            server.invalidate_user("a")
+            second = asyncio.create_task(held.read(user_id="a"))
+            await asyncio.sleep(0)
+            held.release.set()
+            await first, await second
+            return await held.read(user_id="a"), held.calls
+
+        assert asyncio.run(scenario()) == ("after", 2)
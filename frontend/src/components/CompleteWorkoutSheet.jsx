@@ -1,4 +1,4 @@
-import { useState } from "react";
+import { useRef, useState } from "react";
 import { Drawer, DrawerContent, DrawerHeader, DrawerTitle, DrawerDescription } from "@/components/ui/drawer";
 import { Button } from "@/components/ui/button";
 import { Input } from "@/components/ui/input";
@@ -6,14 +6,16 @@ import { Badge } from "@/components/ui/badge";
 import { Separator } from "@/components/ui/separator";
 import { Check, Clock, Flame, ArrowRight } from "lucide-react";
 import { useUser } from "@/context/UserContext";
-import { api, parseLoad, formatExerciseTarget } from "@/lib/api";
+import { api, newIdempotencyKey, parseLoad, formatExerciseTarget } from "@/lib/api";
 import { toast } from "sonner";
 
-export function CompleteWorkoutSheet({ plan, exercises, completed, open, onClose, onComplete }) {
+export function CompleteWorkoutSheet({ plan, exercises, completed, loggedSets = {}, draftId, open, onClose, onComplete }) {
   const { user } = useUser();
   const [duration, setDuration] = useState("");
   const [saving, setSaving] = useState(false);
   const [report, setReport] = useState(null);
+  // Retrying the same save reuses its key; a changed duration is a new request.
+  const pendingSave = useRef({ duration: null, key: null });
 
   const completedExercises = exercises.filter((ex) => completed.has(ex.id));
   const totalVolume = completedExercises.reduce((sum, ex) => {
@@ -26,27 +28,39 @@ export function CompleteWorkoutSheet({ plan, exercises, completed, open, onClose
       return;
     }
     setSaving(true);
+    if (pendingSave.current.duration !== duration) {
+      pendingSave.current = { duration, key: newIdempotencyKey() };
+    }
     try {
-      const result = await api.createWorkoutSession({
-        day_number: plan.day_number,
-        day_name: plan.name,
-        duration_minutes: parseInt(duration),
-        exercises: exercises.map((ex) => ({
-          exercise_id: ex.id,
-          name: ex.name,
-          sets: ex.sets,
-          reps: ex.reps,
-          rep_range: ex.rep_range || "",
-          load: ex.current_load,
-          muscle_group: ex.muscle_group,
-          muscle_label: ex.muscle_label,
-          completed: completed.has(ex.id),
-          was_modified: ex.was_modified || false,
-          original_name: ex.original_name || ex.name,
-        })),
-      }, user.id);
+      const result = draftId
+        ? await api.finishWorkoutDraft(
+            draftId, { duration_minutes: parseInt(duration) }, user.id, pendingSave.current.key
+          )
+        : await api.createWorkoutSession({
+            day_number: plan.day_number,
+            day_name: plan.name,
+            duration_minutes: parseInt(duration),
+            exercises: exercises.map((ex) => ({
+              exercise_id: ex.id,
+              name: ex.name,
+              sets: ex.sets,
+              reps: ex.reps,
+              rep_range: ex.rep_range || "",
+              load: ex.current_load,
+              muscle_group: ex.muscle_group,
+              muscle_label: ex.muscle_label,
+              completed: completed.has(ex.id),
+              completed_sets: loggedSets[ex.id] || [],
+              was_modified: ex.was_modified || false,
+              original_name: ex.original_name || ex.name,
+            })),
+          }, user.id, pendingSave.current.key);
+      pendingSave.current = { duration: null, key: null };
       setReport(result.report);
       toast.success("Workout Saved!");
+      if (result.progression?.length) {
+        toast.success(`Load Increased For ${result.progression.map((c) => c.name).join(", ")}`);
+      }
     } catch {
       toast.error("Error Saving Workout");
     }
@@ -13,7 +13,7 @@ import { Label } from "@/components/ui/label";
 import { Switch } from "@/components/ui/switch";
 import { Trash2 } from "lucide-react";
 import { useUser } from "@/context/UserContext";
-import { api } from "@/lib/api";
+import { api, isConflict } from "@/lib/api";
 import { toast } from "sonner";
 
 const MUSCLE_GROUPS = [
@@ -27,7 +27,9 @@ const MUSCLE_GROUPS = [
   { value: "abs", label: "Abs" },
 ];
 
-export function EditExerciseDialog({ exercise, dayNumber, open, onClose, onSave, onAdd, onDelete, mode = "edit" }) {
+export function EditExerciseDialog({
+  exercise, dayNumber, planVersion, onPlanVersion, open, onClose, onSave, onAdd, onDelete, mode = "edit",
+}) {
   const { user } = useUser();
   const isAdd = mode === "add";
   const [name, setName] = useState("");
@@ -90,14 +92,15 @@ export function EditExerciseDialog({ exercise, dayNumber, open, onClose, onSave,
       setSaving(true);
       try {
         const mg = MUSCLE_GROUPS.find((m) => m.value === muscleGroup);
-        await api.updateExercise(dayNumber, exercise.id, {
+        const { version } = await api.updateExercise(dayNumber, exercise.id, {
           ...updates,
           muscle_group: muscleGroup,
           muscle_label: mg?.label || exercise.muscle_label,
-        }, user.id);
+        }, user.id, planVersion);
+        onPlanVersion?.(version);
         toast.success("Saved Permanently");
-      } catch {
-        toast.error("Error Saving");
+      } catch (err) {
+        toast.error(isConflict(err) ? "Plan Changed On Another Device" : "Error Saving");
       }
       setSaving(false);
     }
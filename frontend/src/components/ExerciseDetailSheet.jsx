@@ -1,4 +1,4 @@
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 import { Drawer, DrawerContent, DrawerHeader, DrawerTitle, DrawerDescription } from "@/components/ui/drawer";
 import { Button } from "@/components/ui/button";
 import { Input } from "@/components/ui/input";
@@ -6,7 +6,7 @@ import { MuscleIcon } from "@/components/MuscleIcon";
 import { Plus } from "lucide-react";
 import { AreaChart, Area, XAxis, YAxis, Tooltip, ResponsiveContainer } from "recharts";
 import { useUser } from "@/context/UserContext";
-import { api, parseLoad, formatShortDate } from "@/lib/api";
+import { api, newIdempotencyKey, parseLoad, formatShortDate } from "@/lib/api";
 import { toast } from "sonner";
 
 export function ExerciseDetailSheet({ exercise, dayNumber, open, onClose, onLoadUpdated }) {
@@ -14,6 +14,8 @@ export function ExerciseDetailSheet({ exercise, dayNumber, open, onClose, onLoad
   const [logs, setLogs] = useState([]);
   const [newLoad, setNewLoad] = useState("");
   const [saving, setSaving] = useState(false);
+  // Retrying the same load reuses its key; a different load is a new request.
+  const pendingLog = useRef({ load: null, key: null });
 
   useEffect(() => {
     if (exercise && open && user) {
@@ -31,18 +33,22 @@ export function ExerciseDetailSheet({ exercise, dayNumber, open, onClose, onLoad
   const handleAddLoad = async () => {
     if (!newLoad.trim()) return;
     setSaving(true);
+    if (pendingLog.current.load !== newLoad) {
+      pendingLog.current = { load: newLoad, key: newIdempotencyKey() };
+    }
     try {
-      await api.createExerciseLog({
+      const { plan_version } = await api.createExerciseLog({
         exercise_id: exercise.id,
         exercise_name: exercise.name,
         load: newLoad,
         sets: exercise.sets,
         reps: exercise.reps,
         day_number: dayNumber,
-      }, user.id);
+      }, user.id, pendingLog.current.key);
+      pendingLog.current = { load: null, key: null };
       const updated = await api.getExerciseLogs(exercise.id, user.id);
       setLogs(updated);
-      onLoadUpdated(exercise.id, newLoad);
+      onLoadUpdated(exercise.id, newLoad, plan_version);
       setNewLoad("");
       toast.success("Load Updated");
     } catch {
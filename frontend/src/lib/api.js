@@ -8,27 +8,73 @@ const client = axios.create({
   headers: { "Content-Type": "application/json" },
 });
 
+const ifMatch = (version) => (version === undefined || version === null ? {} : { "If-Match": `"${version}"` });
+const etagVersion = (r) => parseInt((r.headers.etag || "").replace(/"/g, ""), 10);
+
+const idempotency = (key) => (key ? { headers: { "Idempotency-Key": key } } : {});
+
+export const isConflict = (err) => err?.response?.status === 409;
+
+export const newIdempotencyKey = () => crypto.randomUUID();
+
 export const api = {
   getProfiles: () => client.get("/profiles").then((r) => r.data),
   getWorkoutPlans: (userId) => client.get(`/workout-plans?user_id=${userId}`).then((r) => r.data),
   getWorkoutPlan: (day, userId) => client.get(`/workout-plans/${day}?user_id=${userId}`).then((r) => r.data),
   createWorkoutDay: (userId, data) => client.post(`/workout-plans?user_id=${userId}`, data || {}).then((r) => r.data),
   deleteWorkoutDay: (day, userId) => client.delete(`/workout-plans/${day}?user_id=${userId}`).then((r) => r.data),
-  updateExercise: (day, exId, data, userId) =>
-    client.put(`/workout-plans/${day}/exercises/${exId}?user_id=${userId}`, data).then((r) => r.data),
-  addExercise: (day, data, userId) =>
-    client.post(`/workout-plans/${day}/exercises?user_id=${userId}`, data).then((r) => r.data),
-  deleteExercise: (day, exId, userId) =>
-    client.delete(`/workout-plans/${day}/exercises/${exId}?user_id=${userId}`).then((r) => r.data),
+  // Plan edits take the plan version they were based on and fail with 409 if it moved on.
+  updateExercise: (day, exId, data, userId, version) =>
+    client
+      .put(`/workout-plans/${day}/exercises/${exId}?user_id=${userId}`, data, { headers: ifMatch(version) })
+      .then((r) => r.data),
+  addExercise: (day, data, userId, version) =>
+    client
+      .post(`/workout-plans/${day}/exercises?user_id=${userId}`, data, { headers: ifMatch(version) })
+      .then((r) => ({ ...r.data, plan_version: etagVersion(r) })),
+  deleteExercise: (day, exId, userId, version) =>
+    client
+      .delete(`/workout-plans/${day}/exercises/${exId}?user_id=${userId}`, { headers: ifMatch(version) })
+      .then((r) => r.data),
+  editPlanExercises: (day, operations, userId, version) =>
+    client
+      .patch(`/workout-plans/${day}/exercises?user_id=${userId}`, { operations }, { headers: ifMatch(version) })
+      .then((r) => r.data),
   updateExerciseLoad: (day, exId, load, userId) =>
     client.put(`/workout-plans/${day}/exercises/${exId}/load?user_id=${userId}`, { load }).then((r) => r.data),
-  getExerciseLogs: (exId, userId) => client.get(`/exercise-logs/${exId}?user_id=${userId}`).then((r) => r.data),
-  createExerciseLog: (data, userId) => client.post(`/exercise-logs?user_id=${userId}`, data).then((r) => r.data),
-  createWorkoutSession: (data, userId) => client.post(`/workout-sessions?user_id=${userId}`, data).then((r) => r.data),
+  getExerciseLogs: (exId, userId) =>
+    client.get(`/exercise-logs/${exId}?user_id=${userId}&across_days=true`).then((r) => r.data),
+  getMovements: (userId) => client.get(`/movements?user_id=${userId}`).then((r) => r.data),
+  getMovementLogs: (movementId, userId) =>
+    client.get(`/movements/${movementId}/logs?user_id=${userId}`).then((r) => r.data),
+  createExerciseLog: (data, userId, key) =>
+    client.post(`/exercise-logs?user_id=${userId}`, data, idempotency(key)).then((r) => r.data),
+  createWorkoutSession: (data, userId, key) =>
+    client.post(`/workout-sessions?user_id=${userId}`, data, idempotency(key)).then((r) => r.data),
   getWorkoutSessions: (userId) => client.get(`/workout-sessions?user_id=${userId}`).then((r) => r.data),
+  getSessionSummaries: (userId) => client.get(`/session-summaries?user_id=${userId}`).then((r) => r.data),
   getWorkoutSession: (id, userId) => client.get(`/workout-sessions/${id}?user_id=${userId}`).then((r) => r.data),
+  startWorkoutDraft: (day, userId, replace = false) =>
+    client.post(`/workout-drafts?user_id=${userId}`, { day_number: day, replace }).then((r) => r.data),
+  patchDraftExercise: (draftId, exId, changes, userId) =>
+    client.patch(`/workout-drafts/${draftId}/exercises/${exId}?user_id=${userId}`, changes).then((r) => r.data),
+  addDraftExercise: (draftId, data, userId) =>
+    client.post(`/workout-drafts/${draftId}/exercises?user_id=${userId}`, data).then((r) => r.data),
+  removeDraftExercise: (draftId, exId, userId) =>
+    client.delete(`/workout-drafts/${draftId}/exercises/${exId}?user_id=${userId}`).then((r) => r.data),
+  finishWorkoutDraft: (draftId, data, userId, key) =>
+    client.post(`/workout-drafts/${draftId}/finish?user_id=${userId}`, data, idempotency(key)).then((r) => r.data),
   getNextWorkout: (userId) => client.get(`/next-workout?user_id=${userId}`).then((r) => r.data),
+  getDashboard: (userId) => client.get(`/dashboard?user_id=${userId}`).then((r) => r.data),
+  getChanges: (since, userId) => client.get(`/sync?user_id=${userId}&since=${since}`).then((r) => r.data),
   seed: () => client.post("/seed").then((r) => r.data),
+  subscribeLive: (userId, onEvent) => {
+    const source = new EventSource(`${API_URL}/live?user_id=${encodeURIComponent(userId)}`);
+    ["log", "load", "draft", "session", "resync"].forEach((type) =>
+      source.addEventListener(type, (e) => onEvent(type, JSON.parse(e.data)))
+    );
+    return () => source.close();
+  },
 };
 
 export const parseLoad = (load) => {
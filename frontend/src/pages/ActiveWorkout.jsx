@@ -5,12 +5,13 @@ import { ArrowLeft, Check, Edit3, Plus, Dumbbell } from "lucide-react";
 import { Button } from "@/components/ui/button";
 import { Progress } from "@/components/ui/progress";
 import { Checkbox } from "@/components/ui/checkbox";
+import { Input } from "@/components/ui/input";
 import { MuscleIcon } from "@/components/MuscleIcon";
 import { ExerciseDetailSheet } from "@/components/ExerciseDetailSheet";
 import { EditExerciseDialog } from "@/components/EditExerciseDialog";
 import { CompleteWorkoutSheet } from "@/components/CompleteWorkoutSheet";
 import { useUser } from "@/context/UserContext";
-import { api, formatExerciseTarget } from "@/lib/api";
+import { api, formatExerciseTarget, isConflict } from "@/lib/api";
 import { toast } from "sonner";
 
 export default function ActiveWorkout() {
@@ -20,29 +21,74 @@ export default function ActiveWorkout() {
   const [plan, setPlan] = useState(null);
   const [exercises, setExercises] = useState([]);
   const [completed, setCompleted] = useState(new Set());
+  // Sets actually performed, per exercise; load progression is decided from these, not from the plan.
+  const [loggedSets, setLoggedSets] = useState({});
+  const [repsInput, setRepsInput] = useState({});
   const [selectedExercise, setSelectedExercise] = useState(null);
   const [editingExercise, setEditingExercise] = useState(null);
   const [addingExercise, setAddingExercise] = useState(false);
   const [showComplete, setShowComplete] = useState(false);
   const [loading, setLoading] = useState(true);
+  const [draftId, setDraftId] = useState(null);
+  const [replaceDraft, setReplaceDraft] = useState(false);
 
   useEffect(() => {
     api
       .getWorkoutPlan(parseInt(dayNumber), user.id)
-      .then((p) => {
+      .then(async (p) => {
         setPlan(p);
-        setExercises(
-          p.exercises.map((ex) => ({
-            ...ex,
-            was_modified: false,
-            original_name: ex.name,
-          }))
-        );
+        let planExercises = p.exercises.map((ex) => ({
+          ...ex,
+          was_modified: false,
+          original_name: ex.name,
+        }));
+        try {
+          // Resume the server-side draft if the app was closed mid-workout.
+          const draft = await api.startWorkoutDraft(parseInt(dayNumber), user.id, replaceDraft);
+          const drafted = Object.fromEntries(draft.exercises.map((d) => [d.exercise_id, d]));
+          planExercises = planExercises.map((ex) => {
+            const d = drafted[ex.id];
+            if (!d) return ex;
+            return {
+              ...ex,
+              name: d.name,
+              sets: d.sets,
+              reps: d.reps,
+              rep_range: d.rep_range,
+              current_load: d.load,
+              muscle_group: d.muscle_group,
+              muscle_label: d.muscle_label,
+              was_modified: d.was_modified,
+              original_name: d.original_name || ex.name,
+            };
+          });
+          setCompleted(new Set(draft.exercises.filter((d) => d.completed).map((d) => d.exercise_id)));
+          setLoggedSets(Object.fromEntries(draft.exercises.map((d) => [
+            d.exercise_id, (d.completed_sets || []).map(({ reps, load }) => ({ reps, load })),
+          ])));
+          setDraftId(draft.id);
+        } catch (err) {
+          setDraftId(null);
+          if (isConflict(err)) {
+            // Another day's workout is still open; without a draft this one would not survive a reload.
+            toast.warning(err.response.data.detail, {
+              duration: Infinity,
+              action: { label: "Discard It", onClick: () => setReplaceDraft(true) },
+            });
+          }
+        }
+        setExercises(planExercises);
       })
       .finally(() => setLoading(false));
-  }, [dayNumber, user.id]);
+  }, [dayNumber, user.id, replaceDraft]);
+
+  const syncDraft = (exId, changes) => {
+    if (!draftId) return;
+    api.patchDraftExercise(draftId, exId, changes, user.id).catch(() => {});
+  };
 
   const toggleComplete = (exId) => {
+    syncDraft(exId, { completed: !completed.has(exId) });
     setCompleted((prev) => {
       const next = new Set(prev);
       if (next.has(exId)) next.delete(exId);
@@ -51,7 +97,18 @@ export default function ActiveWorkout() {
     });
   };
 
+  const logSet = (ex) => {
+    const reps = parseInt(repsInput[ex.id] ?? ex.reps);
+    if (!(reps >= 0)) return;
+    const set = { reps, load: ex.current_load };
+    syncDraft(ex.id, { logged_set: set });
+    setLoggedSets((prev) => ({ ...prev, [ex.id]: [...(prev[ex.id] || []), set] }));
+    setRepsInput((prev) => ({ ...prev, [ex.id]: undefined }));
+  };
+
   const updateExercise = (exId, updates) => {
+    const { current_load, ...rest } = updates;
+    syncDraft(exId, { ...rest, load: current_load, was_modified: true });
     setExercises((prev) =>
       prev.map((ex) => (ex.id === exId ? { ...ex, ...updates, was_modified: true } : ex))
     );
@@ -59,22 +116,40 @@ export default function ActiveWorkout() {
 
   const handleAddExercise = async (data) => {
     try {
-      const newEx = await api.addExercise(parseInt(dayNumber), data, user.id);
+      const { plan_version, ...newEx } = await api.addExercise(parseInt(dayNumber), data, user.id, plan?.version);
+      setPlan((p) => ({ ...p, version: plan_version }));
+      if (draftId) {
+        api.addDraftExercise(draftId, {
+          exercise_id: newEx.id,
+          name: newEx.name,
+          sets: newEx.sets,
+          reps: newEx.reps,
+          rep_range: newEx.rep_range || "",
+          load: newEx.current_load,
+          muscle_group: newEx.muscle_group,
+          muscle_label: newEx.muscle_label,
+          completed: false,
+          original_name: newEx.name,
+        }, user.id).catch(() => {});
+      }
       setExercises((prev) => [...prev, { ...newEx, was_modified: false, original_name: newEx.name }]);
       toast.success("Exercise Added");
-    } catch {
-      toast.error("Failed To Add Exercise");
+    } catch (err) {
+      toast.error(isConflict(err) ? "Plan Changed On Another Device" : "Failed To Add Exercise");
     }
   };
 
   const handleDeleteExercise = async (exId) => {
     try {
-      await api.deleteExercise(parseInt(dayNumber), exId, user.id);
+      const { version } = await api.deleteExercise(parseInt(dayNumber), exId, user.id, plan?.version);
+      setPlan((p) => ({ ...p, version }));
+      if (draftId) api.removeDraftExercise(draftId, exId, user.id).catch(() => {});
       setExercises((prev) => prev.filter((ex) => ex.id !== exId));
       setCompleted((prev) => { const n = new Set(prev); n.delete(exId); return n; });
+      setLoggedSets((prev) => { const { [exId]: _, ...rest } = prev; return rest; });
       toast.success("Exercise Removed");
-    } catch {
-      toast.error("Failed To Remove Exercise");
+    } catch (err) {
+      toast.error(isConflict(err) ? "Plan Changed On Another Device" : "Failed To Remove Exercise");
     }
   };
 
@@ -129,6 +204,7 @@ export default function ActiveWorkout() {
 
         {exercises.map((ex, i) => {
           const isDone = completed.has(ex.id);
+          const sets = loggedSets[ex.id] || [];
           return (
             <motion.div
               key={ex.id}
@@ -185,6 +261,39 @@ export default function ActiveWorkout() {
                   </button>
                 </div>
               </div>
+              {ex.reps > 0 && (
+                <div className="flex items-center gap-2 mt-3 ml-9" data-testid={`logged-sets-${ex.id}`}>
+                  <div className="flex flex-wrap gap-1.5 flex-1">
+                    {sets.map((s, n) => (
+                      <span key={n} className="text-[11px] font-bold bg-secondary/60 px-2 py-1 rounded-lg">
+                        {s.reps}×{s.load === "Bodyweight" ? "BW" : s.load}
+                      </span>
+                    ))}
+                    {sets.length === 0 && (
+                      <span className="text-[11px] text-muted-foreground py-1">No Sets Logged</span>
+                    )}
+                  </div>
+                  {!isDone && sets.length < ex.sets && (
+                    <>
+                      <Input
+                        type="number"
+                        inputMode="numeric"
+                        value={repsInput[ex.id] ?? ex.reps}
+                        onChange={(e) => setRepsInput((prev) => ({ ...prev, [ex.id]: e.target.value }))}
+                        className="w-14 h-8 rounded-xl text-center text-sm"
+                        data-testid={`set-reps-input-${ex.id}`}
+                      />
+                      <button
+                        onClick={() => logSet(ex)}
+                        className="h-8 px-3 rounded-xl bg-primary/10 text-primary text-xs font-bold transition-all active:scale-90"
+                        data-testid={`log-set-${ex.id}`}
+                      >
+                        Set {sets.length + 1}
+                      </button>
+                    </>
+                  )}
+                </div>
+              )}
             </motion.div>
           );
         })}
@@ -221,7 +330,10 @@ export default function ActiveWorkout() {
         dayNumber={parseInt(dayNumber)}
         open={!!selectedExercise}
         onClose={() => setSelectedExercise(null)}
-        onLoadUpdated={(exId, newLoad) => {
+        onLoadUpdated={(exId, newLoad, planVersion) => {
+          syncDraft(exId, { load: newLoad });
+          // Setting the load moves the plan version; keep ours so the next edit's If-Match still holds.
+          if (planVersion) setPlan((p) => ({ ...p, version: planVersion }));
           setExercises((prev) =>
             prev.map((ex) => (ex.id === exId ? { ...ex, current_load: newLoad } : ex))
           );
@@ -232,6 +344,8 @@ export default function ActiveWorkout() {
       <EditExerciseDialog
         exercise={editingExercise}
         dayNumber={parseInt(dayNumber)}
+        planVersion={plan?.version}
+        onPlanVersion={(version) => setPlan((p) => ({ ...p, version }))}
         open={!!editingExercise}
         onClose={() => setEditingExercise(null)}
         onSave={(exId, updates) => {
@@ -259,6 +373,8 @@ export default function ActiveWorkout() {
         plan={plan}
         exercises={exercises}
         completed={completed}
+        loggedSets={loggedSets}
+        draftId={draftId}
         open={showComplete}
         onClose={() => setShowComplete(false)}
         onComplete={() => navigate("/")}
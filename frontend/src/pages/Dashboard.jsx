@@ -37,17 +37,14 @@ export default function Dashboard() {
 
   const loadData = () => {
     setLoading(true);
-    Promise.all([
-      api.getWorkoutPlans(user.id),
-      api.getNextWorkout(user.id),
-      api.getWorkoutSessions(user.id),
-    ])
-      .then(([p, n, s]) => {
-        setPlans(p);
-        setNextDay(n.next_day);
-        setLastSessions(n.last_sessions || {});
-        setSessions(s);
-        setExpandedDays(new Set([n.next_day]));
+    api
+      .getDashboard(user.id)
+      .then((d) => {
+        setPlans(d.plans);
+        setNextDay(d.next_day);
+        setLastSessions(d.last_sessions || {});
+        setSessions(d.recent_sessions);
+        setExpandedDays(new Set([d.next_day]));
       })
       .finally(() => setLoading(false));
   };
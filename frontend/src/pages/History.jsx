@@ -20,7 +20,12 @@ export default function History() {
   const navigate = useNavigate();
 
   useEffect(() => {
-    api.getWorkoutSessions(user.id).then(setSessions).finally(() => setLoading(false));
+    api.getSessionSummaries(user.id).then(setSessions).finally(() => setLoading(false));
+    // Sessions finished on another device show up without polling.
+    return api.subscribeLive(user.id, (type, data) => {
+      if (type === "session") setSessions((prev) => [data, ...prev.filter((s) => s.id !== data.id)]);
+      if (type === "resync") api.getSessionSummaries(user.id).then(setSessions);
+    });
   }, [user.id]);
 
   if (loading) {
@@ -66,9 +71,9 @@ export default function History() {
                         <Badge className={`text-[10px] font-bold rounded-full border-0 shrink-0 ${colors.badge}`}>
                           {s.day_name}
                         </Badge>
-                        {s.report?.load_changes?.length > 0 && (
+                        {s.load_change_count > 0 && (
                           <span className="text-[10px] font-bold text-green-500">
-                            +{s.report.load_changes.length} Changes
+                            +{s.load_change_count} Changes
                           </span>
                         )}
                       </div>
@@ -85,7 +90,7 @@ export default function History() {
                         <div className="flex items-center gap-1.5 justify-end mt-0.5">
                           <Flame size={12} className="text-primary/60" />
                           <p className="text-[10px] text-muted-foreground">
-                            {s.report?.total_volume?.toLocaleString("en-US")}kg
+                            {s.total_volume?.toLocaleString("en-US")}kg
                           </p>
                         </div>
                       </div>